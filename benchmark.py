@@ -0,0 +1,255 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from instrumentation import peak_rss_mb
+
+# Synthetic dataset sizes (rows) benchmarked by default
+SIZES = [10000, 100000, 1000000, 10000000]
+
+# Seed of the synthetic datasets, so every run times the same data
+DATA_SEED = 20240101
+
+# Where the synthetic CSVs and the benchmark outputs live
+DATA_DIR = "benchmark_data"
+
+# Run history and the baseline runs are compared against
+HISTORY_FILE = os.path.join("benchmark_results", "history.json")
+BASELINE_FILE = os.path.join("benchmark_results", "baseline.json")
+
+# A run regresses when its wall time or peak RSS exceeds the baseline by more than this fraction
+REGRESSION_THRESHOLD = 0.20
+
+# Columns kept out of null injection, as in null_adder.py
+PROTECTED_COLUMNS = ['ID', 'CNTYFIPS', 'Ori', 'Solved']
+
+# Team split used for the dataset_creator benchmark
+BENCH_TEAMS = {
+    "Team 1": ["State", "Agency", "Year", "Month"],
+    "Team 2": ["Agentype", "Source", "OffAge", "OffSex", "OffRace"],
+    "Team 3": ["Homicide", "Situation", "Weapon"],
+}
+
+
+def _bench_noise_adder(n_rows, input_file, work_dir):
+    # The generator noise_adder.py runs under __main__ (GENERATION_MODE = "vectorized")
+    from noise_adder import generate_noisy_homicide_records_vectorized
+    records = generate_noisy_homicide_records_vectorized(n_rows, rng=DATA_SEED)
+    records.to_csv(os.path.join(work_dir, "noise.csv"), index=False)
+
+
+def _bench_noise_adder_streaming(n_rows, input_file, work_dir):
+    from noise_adder import write_noisy_homicide_records_streaming
+    write_noisy_homicide_records_streaming(n_rows, os.path.join(work_dir, "noise.csv"), seed=DATA_SEED)
+
+
+def _bench_outlier_adder(n_rows, input_file, work_dir):
+    from outlier_adder import add_outliers_to_crime_data
+    add_outliers_to_crime_data(input_file, os.path.join(work_dir, "outliers.csv"), seed=0)
+
+
+def _bench_outlier_adder_streaming(n_rows, input_file, work_dir):
+    from outlier_adder import add_outliers_to_crime_data_streaming
+    add_outliers_to_crime_data_streaming(input_file, os.path.join(work_dir, "outliers.csv"), seed=0)
+
+
+def _bench_null_adder(n_rows, input_file, work_dir):
+    from null_adder import add_random_nulls
+    add_random_nulls(input_file, os.path.join(work_dir, "nulls.csv"), n_rows, PROTECTED_COLUMNS, 0.10, seed=0)
+
+
+def _bench_dada_shuffler(n_rows, input_file, work_dir):
+    from dada_shuffler import shuffle_csv
+    shuffle_csv(input_file, os.path.join(work_dir, "shuffled.csv"), seed=0)
+
+
+def _bench_dada_shuffler_mmap(n_rows, input_file, work_dir):
+    from dada_shuffler import shuffle_csv_mmap
+    shuffle_csv_mmap(input_file, os.path.join(work_dir, "shuffled.csv"), seed=0)
+
+
+def _bench_outlier_detector(n_rows, input_file, work_dir):
+    from outlier_detector import detect_outliers_streaming
+    detect_outliers_streaming(input_file, os.path.join(work_dir, "detected.csv"), seed=0)
+
+
+def _bench_dataset_creator(n_rows, input_file, work_dir):
+    from dataset_creator import generate_team_datasets
+    generate_team_datasets(BENCH_TEAMS, input_file=input_file, output_directory=os.path.join(work_dir, "teams"))
+
+
+# Entry point name -> (module it benchmarks, benchmark function(n_rows, input_file, work_dir)).
+# A script's own name times what it runs under __main__; *_streaming / *_mmap time
+# the alternative large-file paths.
+ENTRY_POINTS = {
+    "noise_adder": ("noise_adder", _bench_noise_adder),
+    "noise_adder_streaming": ("noise_adder", _bench_noise_adder_streaming),
+    "outlier_adder": ("outlier_adder", _bench_outlier_adder),
+    "outlier_adder_streaming": ("outlier_adder", _bench_outlier_adder_streaming),
+    "null_adder": ("null_adder", _bench_null_adder),
+    "dada_shuffler": ("dada_shuffler", _bench_dada_shuffler),
+    "dada_shuffler_mmap": ("dada_shuffler", _bench_dada_shuffler_mmap),
+    "outlier_detector": ("outlier_detector", _bench_outlier_detector),
+    "dataset_creator": ("dataset_creator", _bench_dataset_creator),
+}
+
+
+def synthetic_dataset(n_rows, data_dir=DATA_DIR):
+    """
+    Path of the seeded synthetic crime CSV with n_rows rows, generating it on first use.
+
+    Rows come from noise_adder's generator, whose columns follow features.txt.
+    """
+    path = os.path.join(data_dir, f"synthetic-{n_rows}.csv")
+    if not os.path.exists(path):
+        from noise_adder import write_noisy_homicide_records_streaming
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {path}")
+        write_noisy_homicide_records_streaming(n_rows, f"{path}.tmp", seed=DATA_SEED)
+        os.replace(f"{path}.tmp", path)
+    return path
+
+
+def _run_one(entry, n_rows, input_file, work_dir):
+    # Child process: time one entry point and report wall time and peak RSS as JSON.
+    # The work folder (outputs and the loader's Parquet cache) starts empty, so
+    # every run measures a cold cache.
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    os.environ["CIPHER_CACHE_DIR"] = work_dir
+    # Import the module (and with it pandas, numpy, pyarrow and its own lookup tables)
+    # before the timer starts, so only the entry point itself is timed
+    module_name, bench = ENTRY_POINTS[entry]
+    importlib.import_module(module_name)
+    start = time.perf_counter()
+    bench(n_rows, input_file, work_dir)
+    wall = time.perf_counter() - start
+    print(json.dumps({"wall_s": wall, "peak_rss_mb": peak_rss_mb()}))
+
+
+def run_benchmark(entry, n_rows, data_dir=DATA_DIR):
+    """
+    Time one entry point on the n_rows dataset in a fresh Python process.
+
+    Returns:
+    Dict with entry, rows, wall_s, peak_rss_mb and rows_per_s
+    """
+    input_file = os.path.abspath(synthetic_dataset(n_rows, data_dir))
+    work_dir = os.path.abspath(os.path.join(data_dir, f"run-{entry}-{n_rows}"))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-one", entry, str(n_rows), input_file, work_dir],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"{entry} ({n_rows} rows) failed:\n{completed.stderr}")
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"entry": entry, "rows": n_rows, **measured, "rows_per_s": n_rows / measured["wall_s"]}
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare results against baseline results.
+
+    Returns:
+    List of regression messages (empty when nothing regressed)
+    """
+    baseline_by_key = {(r["entry"], r["rows"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        reference = baseline_by_key.get((result["entry"], result["rows"]))
+        if reference is None:
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            ratio = result[metric] / reference[metric]
+            if ratio > 1 + threshold:
+                regressions.append(f"{result['entry']} ({result['rows']} rows): {metric} "
+                                   f"{reference[metric]:.2f} -> {result[metric]:.2f} ({ratio - 1:+.0%})")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data-prep scripts on synthetic crime CSVs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="dataset sizes in rows")
+    parser.add_argument("--entries", nargs="+", default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS))
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed slowdown / memory growth against the baseline (fraction)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--run-one", nargs=4, metavar=("ENTRY", "ROWS", "INPUT", "WORK_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        entry, n_rows, input_file, work_dir = args.run_one
+        _run_one(entry, int(n_rows), input_file, work_dir)
+        return 0
+
+    results = []
+    for n_rows in args.sizes:
+        for entry in args.entries:
+            result = run_benchmark(entry, n_rows, args.data_dir)
+            results.append(result)
+            print(f"{entry:>23} {n_rows:>9} rows: {result['wall_s']:8.2f}s  "
+                  f"{result['peak_rss_mb']:8.1f} MB  {result['rows_per_s']:12,.0f} rows/s")
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "results": results,
+    }
+    history = _load_json(args.history, [])
+    history.append(run)
+    _save_json(args.history, history)
+    print(f"Results appended to {args.history}")
+
+    if args.save_baseline:
+        _save_json(args.baseline, run)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = _load_json(args.baseline, None)
+    if baseline is None:
+        print("No baseline yet; run with --save-baseline to store one")
+        return 0
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions against the baseline from {baseline['timestamp']} (threshold {args.threshold:.0%}):")
+        for message in regressions:
+            print(f"- {message}")
+        return 1
+    print(f"No regressions against the baseline from {baseline['timestamp']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,245 @@
 import csv
+import math
+import mmap
+import os
 import random
+import tempfile
+
+import numpy as np
+
+from instrumentation import stage
+
+try:
+    import resource  # open-file limit for the external shuffle (not available on Windows)
+except ImportError:
+    resource = None
 
 # Define input and output file paths here
 INPUT_CSV_PATH = "temp3.csv"  # Replace with your actual input file path
 OUTPUT_CSV_PATH = "shuffled_output.csv"  # Name for your shuffled output file
 
-def shuffle_csv(input_file, output_file):
+# Rough ratio between the in-memory size of parsed rows (lists of str objects)
+# and their size on disk, used to size the buckets of the external shuffle
+ROW_MEMORY_FACTOR = 6
+
+# Most bucket files the external shuffle keeps open at once (also the cap when
+# the open-file limit is unknown, e.g. on Windows), and files left for the rest
+MAX_OPEN_BUCKETS = 1000
+OPEN_FILE_RESERVE = 32
+
+# Bytes scanned per step when indexing record boundaries, and bytes buffered
+# per write in the memory-mapped shuffle
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+def shuffle_csv(input_file, output_file, seed=None):
     """
     Reads a CSV file, randomly shuffles all rows, and writes the shuffled data to a new CSV file.
     
     Args:
         input_file (str): Path to the input CSV file
         output_file (str): Path to save the shuffled output CSV file
+        seed (int, optional): Seed for a reproducible shuffle
     """
     # Read all rows from the input CSV file
-    with open(input_file, 'r', newline='') as csvfile:
+    with stage("dada_shuffler.load") as s, open(input_file, 'r', newline='') as csvfile:
         reader = csv.reader(csvfile)
         header = next(reader)  # Save the header row
         rows = list(reader)    # Read all data rows
+        s.rows = len(rows)
     
     # Shuffle the rows randomly
-    random.shuffle(rows)
+    with stage("dada_shuffler.shuffle", rows=len(rows)):
+        random.Random(seed).shuffle(rows)
     
     # Write the shuffled data to the output file
-    with open(output_file, 'w', newline='') as csvfile:
+    with stage("dada_shuffler.write", rows=len(rows)), open(output_file, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(header)  # Write the header row first
         writer.writerows(rows)   # Write all shuffled data rows
     
     print(f"Shuffled {len(rows)} rows from '{input_file}' to '{output_file}'")
 
+def _max_open_buckets():
+    # Bucket files one scatter pass may hold open: the soft open-file limit minus
+    # room for the input, the output and whatever else the process has open
+    if resource is None:
+        return MAX_OPEN_BUCKETS
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return MAX_OPEN_BUCKETS
+    return max(2, min(MAX_OPEN_BUCKETS, soft_limit - OPEN_FILE_RESERVE))
+
+def _scatter_rows(rows, bucket_dir, num_buckets, rng):
+    """
+    Writes every row to one of num_buckets bucket files in bucket_dir, chosen
+    uniformly at random. Returns the bucket paths and their row counts.
+    """
+    bucket_paths = [os.path.join(bucket_dir, f"bucket-{i:05d}.csv") for i in range(num_buckets)]
+    bucket_counts = [0] * num_buckets
+    bucket_files = [open(path, 'w', newline='') for path in bucket_paths]
+    try:
+        bucket_writers = [csv.writer(f) for f in bucket_files]
+        for row in rows:
+            bucket = rng.randrange(num_buckets)
+            bucket_writers[bucket].writerow(row)
+            bucket_counts[bucket] += 1
+    finally:
+        for f in bucket_files:
+            f.close()
+    return bucket_paths, bucket_counts
+
+def _gather_bucket(path, row_count, writer, rng, memory_limit_bytes, max_buckets):
+    """
+    Appends the rows of one bucket file to writer in uniformly random order.
+    
+    A bucket that fits in memory_limit_bytes is shuffled in memory. A larger
+    one (only possible when the fan-out was capped by the open-file limit) is
+    scattered again into sub-buckets, which are gathered the same way.
+    """
+    bucket_size = os.path.getsize(path)
+    if bucket_size * ROW_MEMORY_FACTOR <= memory_limit_bytes or row_count <= 1:
+        with open(path, 'r', newline='') as bucket:
+            rows = list(csv.reader(bucket))
+        rng.shuffle(rows)
+        writer.writerows(rows)
+        return
+    
+    num_buckets = min(max_buckets, math.ceil(bucket_size * ROW_MEMORY_FACTOR / memory_limit_bytes))
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as bucket_dir:
+        with open(path, 'r', newline='') as bucket:
+            sub_paths, sub_counts = _scatter_rows(csv.reader(bucket), bucket_dir, num_buckets, rng)
+        os.remove(path)  # The rows now live in the sub-buckets
+        for sub_path, sub_count in zip(sub_paths, sub_counts):
+            _gather_bucket(sub_path, sub_count, writer, rng, memory_limit_bytes, max_buckets)
+
+def shuffle_csv_external(input_file, output_file, memory_limit_mb=512, seed=None, temp_dir=None):
+    """
+    Shuffles a CSV file that is too large to hold in memory (two-pass external shuffle).
+    
+    The first pass scatters every row into one of K temporary bucket files,
+    chosen uniformly at random. The second pass loads one bucket at a time,
+    shuffles it in memory and appends it to the output. Random bucket
+    assignment followed by an in-bucket shuffle gives a uniformly random
+    permutation of the whole file. K is chosen so a single bucket fits in
+    memory_limit_mb, but never above the number of files the process may
+    keep open; buckets that still end up too large are split again in a
+    further scatter pass before they are shuffled.
+    
+    Args:
+        input_file (str): Path to the input CSV file
+        output_file (str): Path to save the shuffled output CSV file
+        memory_limit_mb (int): Approximate memory budget for one bucket, in MB
+        seed (int, optional): Seed for a reproducible shuffle
+        temp_dir (str, optional): Directory for the bucket files (default: system temp dir)
+    """
+    rng = random.Random(seed)
+    memory_limit_bytes = memory_limit_mb * 1024 * 1024
+    max_buckets = _max_open_buckets()
+    file_size = os.path.getsize(input_file)
+    num_buckets = max(1, min(max_buckets, math.ceil(file_size * ROW_MEMORY_FACTOR / memory_limit_bytes)))
+    
+    with tempfile.TemporaryDirectory(dir=temp_dir) as bucket_dir:
+        # Pass 1: scatter rows into random buckets
+        with stage("dada_shuffler.scatter") as s:
+            with open(input_file, 'r', newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                header = next(reader)  # Save the header row
+                bucket_paths, bucket_counts = _scatter_rows(reader, bucket_dir, num_buckets, rng)
+            row_count = sum(bucket_counts)
+            s.rows = row_count
+        
+        # Pass 2: shuffle each bucket (splitting oversized ones again) and append it to the output
+        with stage("dada_shuffler.gather", rows=row_count), open(output_file, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header)  # Write the header row first
+            for path, count in zip(bucket_paths, bucket_counts):
+                _gather_bucket(path, count, writer, rng, memory_limit_bytes, max_buckets)
+    
+    print(f"Shuffled {row_count} rows from '{input_file}' to '{output_file}' using {num_buckets} buckets")
+
+def _record_offsets(data):
+    """
+    Builds the offset index of CSV record boundaries in a bytes-like buffer.
+    
+    A newline only ends a record when an even number of quote characters
+    precede it, so quoted fields containing commas or newlines stay in one
+    record (escaped "" quotes keep the parity unchanged). The scan works on
+    fixed-size blocks with NumPy, carrying the quote parity between blocks.
+    
+    Returns:
+        np.ndarray: uint64 offsets; record i spans offsets[i]:offsets[i + 1]
+    """
+    ends = []
+    in_quotes = 0
+    for block_start in range(0, len(data), SCAN_BLOCK_SIZE):
+        block_len = min(SCAN_BLOCK_SIZE, len(data) - block_start)
+        block = np.frombuffer(data, dtype=np.uint8, count=block_len, offset=block_start)
+        quotes = np.flatnonzero(block == ord('"'))
+        newlines = np.flatnonzero(block == ord('\n'))
+        quoted = (in_quotes + np.searchsorted(quotes, newlines)) & 1
+        ends.append(newlines[quoted == 0].astype(np.uint64) + (block_start + 1))
+        in_quotes = (in_quotes + len(quotes)) & 1
+        del block
+    
+    offsets = np.concatenate([np.zeros(1, dtype=np.uint64)] + ends)
+    if offsets[-1] != len(data):
+        # Last record has no trailing newline
+        offsets = np.append(offsets, np.uint64(len(data)))
+    return offsets
+
+def shuffle_csv_mmap(input_file, output_file, seed=None):
+    """
+    Shuffles a CSV file by reordering raw records, without parsing any fields.
+    
+    The input is memory-mapped, a quote-aware offset index of record
+    boundaries is built, and the index (not the rows) is permuted. The raw
+    byte slices are then written in permuted order with large buffered
+    writes, so records are copied byte-for-byte, including their quoting and
+    line endings. Best for files that fit in the page cache; use
+    shuffle_csv_external for files much larger than RAM.
+    
+    Args:
+        input_file (str): Path to the input CSV file
+        output_file (str): Path to save the shuffled output CSV file
+        seed (int, optional): Seed for a reproducible shuffle
+    """
+    if os.path.getsize(input_file) == 0:
+        open(output_file, 'wb').close()
+        print(f"'{input_file}' is empty, nothing to shuffle")
+        return
+    
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with stage("dada_shuffler.index") as s:
+            offsets = _record_offsets(data)
+            num_rows = s.rows = len(offsets) - 2  # Record 0 is the header
+        header = data[:int(offsets[1])]
+        line_ending = b'\r\n' if header.endswith(b'\r\n') else b'\n'
+        last_end = int(offsets[-1])
+        
+        order = np.random.default_rng(seed).permutation(num_rows) + 1
+        
+        with stage("dada_shuffler.write", rows=num_rows), open(output_file, 'wb') as out:
+            out.write(header if header.endswith(b'\n') else header + line_ending)
+            pending = []
+            pending_size = 0
+            # Convert the permuted offsets to Python ints a block at a time to keep the index compact
+            for block_start in range(0, num_rows, 1024 * 1024):
+                block = order[block_start:block_start + 1024 * 1024]
+                for start, end in zip(offsets[block].tolist(), offsets[block + 1].tolist()):
+                    record = data[start:end]
+                    if end == last_end and not record.endswith(b'\n'):
+                        record += line_ending
+                    pending.append(record)
+                    pending_size += len(record)
+                    if pending_size >= WRITE_BUFFER_SIZE:
+                        out.write(b''.join(pending))
+                        pending = []
+                        pending_size = 0
+            out.write(b''.join(pending))
+    
+    print(f"Shuffled {num_rows} rows from '{input_file}' to '{output_file}'")
+
 # Set a random seed for reproducible results (optional)
 # random.seed(42)
 
@@ -0,0 +1,98 @@
+import hashlib
+import glob
+import os
+
+import pandas as pd
+
+from schema import apply_schema, to_default_dtypes
+
+# Folder for cached columnar copies of the source CSVs. Defaults to a
+# ".data_cache" folder next to each source file; set CIPHER_CACHE_DIR to
+# keep every cache in one place instead.
+CACHE_DIR_ENV = "CIPHER_CACHE_DIR"
+
+# Bump when the cache layout or encoding changes, so old cache files are rebuilt
+CACHE_VERSION = 2
+
+try:
+    import pyarrow  # noqa: F401  (needed by DataFrame.to_parquet / read_parquet)
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+
+def short_hash(text):
+    """Short hex digest used in cache file names (the first 12 characters of the SHA-1)."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _cache_path(csv_path, read_options):
+    # File name: <stem>-<source path + parse options>-<mtime + size>.parquet, so a
+    # changed CSV replaces its own cache without touching caches made with other options
+    abs_path = os.path.abspath(csv_path)
+    stat = os.stat(abs_path)
+    source_key = short_hash(f"{abs_path}|{sorted(read_options.items())!r}|{CACHE_VERSION}")
+    version_key = short_hash(f"{stat.st_mtime_ns}|{stat.st_size}")
+
+    cache_dir = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(abs_path), ".data_cache")
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{source_key}-{version_key}.parquet")
+
+
+def _build_cache(csv_path, cache_path, read_options):
+    df = apply_schema(pd.read_csv(csv_path, **read_options))
+
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Drop stale caches of the same file and options before writing the new one
+    prefix = os.path.basename(cache_path).rsplit("-", 1)[0]
+    for old_path in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(prefix)}-*.parquet")):
+        os.remove(old_path)
+
+    tmp_path = f"{cache_path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+    return df
+
+
+def is_cached(csv_path, **read_options):
+    """True when load_csv would read csv_path from an up-to-date cache instead of parsing the CSV."""
+    return HAVE_PARQUET and os.path.exists(_cache_path(csv_path, read_options))
+
+
+def load_csv(csv_path, columns=None, compact=True, **read_options):
+    """
+    Load a crime CSV through a cached columnar (Parquet) copy.
+
+    The first load parses the CSV and writes the cache; later loads of the
+    same unchanged file read the Parquet file instead, touching only the
+    requested columns. Columns use the compact dtypes from schema.py. The
+    cache is keyed by path, mtime, size and the read_csv options, so editing
+    the CSV rebuilds it automatically. Without pyarrow this falls back to a
+    plain pd.read_csv.
+
+    Parameters:
+    csv_path (str): Path to the source CSV file
+    columns (list): Columns to load (default: all)
+    compact (bool): Return the compact schema dtypes (categories, small
+        nullable ints); False converts back to read_csv's default dtypes
+        for code that checks for object/int64 columns (default: True)
+    **read_options: Extra pd.read_csv options used when parsing the CSV
+
+    Returns:
+    DataFrame with the requested columns
+    """
+    if not HAVE_PARQUET:
+        df = apply_schema(pd.read_csv(csv_path, usecols=columns, **read_options))
+        return df if compact else to_default_dtypes(df)
+
+    cache_path = _cache_path(csv_path, read_options)
+    if os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path, columns=columns)
+    else:
+        df = _build_cache(csv_path, cache_path, read_options)
+        if columns is not None:
+            df = df[list(columns)]
+
+    return df if compact else to_default_dtypes(df)
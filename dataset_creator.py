@@ -2,12 +2,22 @@ import pandas as pd
 import tkinter as tk
 from tkinter import messagebox, Checkbutton, IntVar, ttk
 import os
-from functools import partial
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from data_cache import is_cached, load_csv
+from instrumentation import stage
 
 # Static input file path - replace with your actual dataset path
 INPUT_FILE_PATH = "Shuffled Datasets\Crime Data Prototype-2 (shuffled).csv"  # Change this to your actual file path
 OUTPUT_DIRECTORY = "Round-2 Datasets"    # Folder to store all team datasets
 
+# Rows per chunk when the GUI reads columns, and how often it checks on the worker
+GUI_READ_CHUNK_ROWS = 100000
+GUI_POLL_INTERVAL_MS = 100
+
 # Always selected features
 REQUIRED_FEATURES = [
     "ID", "CNTYFIPS", "Ori", "OffCount", "ActionType", 
@@ -45,6 +55,9 @@ def select_features():
     feature_vars = {}
     features = []
     
+    # Session cache of parsed columns (name -> Series), so later teams don't re-read the file
+    column_cache = {}
+    
     def update_feature_display():
         # Clear previous checkboxes
         for widget in selected_frame.winfo_children():
@@ -129,6 +142,7 @@ def select_features():
         try:
             df = pd.read_csv(INPUT_FILE_PATH, nrows=0)
             features = df.columns.tolist()
+            column_cache.clear()
             
             # Create variables for each feature
             feature_vars = {}
@@ -163,33 +177,53 @@ def select_features():
                 feature_vars[feature].set(0)
         update_feature_display()
     
-    def generate_dataset():
-        # Get selected features
-        selected_features = [feature for feature in features if feature_vars[feature].get() == 1]
+    def show_team_summary(team_name, selected_features):
+        # Show selected features in the text widget
+        features_text.config(state=tk.NORMAL)
+        features_text.delete(1.0, tk.END)
         
-        # Ensure required features are always included
-        for feature in REQUIRED_FEATURES:
-            if feature in features and feature not in selected_features:
-                selected_features.append(feature)
+        # Separate required and optional features for display
+        req_features = [f for f in selected_features if f in REQUIRED_FEATURES]
+        opt_features = [f for f in selected_features if f not in REQUIRED_FEATURES]
         
-        team_name = team_entry.get().strip()
-        if not team_name:
-            messagebox.showerror("Error", "Please enter a team name")
-            return
+        features_text.insert(tk.END, f"Features selected for team '{team_name}':\n\n", "header")
+        features_text.insert(tk.END, "Required Features:\n", "subheader")
+        for feature in req_features:
+            features_text.insert(tk.END, f"• {feature}\n", "required")
+            
+        features_text.insert(tk.END, "\nOptional Features:\n", "subheader")
+        if opt_features:
+            for feature in opt_features:
+                features_text.insert(tk.END, f"• {feature}\n", "optional")
+        else:
+            features_text.insert(tk.END, "None\n", "italic")
         
+        features_text.config(state=tk.DISABLED)
+    
+    def write_team_dataset(team_name, selected_features, messages):
+        # Runs on a background thread: only touches pandas and the queue, never Tk widgets
         try:
-            # Read the CSV
-            df = pd.read_csv(INPUT_FILE_PATH)
-            
-            # Validate selected features exist in dataframe
-            valid_features = [f for f in selected_features if f in df.columns]
-            if len(valid_features) != len(selected_features):
-                invalid_features = set(selected_features) - set(valid_features)
-                messagebox.showwarning("Warning", f"Some features not found in dataset: {', '.join(invalid_features)}\nProceeding with valid features only.")
-                selected_features = valid_features
+            # Load only the columns that are not cached yet: from the columnar file cache when
+            # it is already built, otherwise just those columns of the CSV, as text, in chunks
+            missing = [f for f in selected_features if f not in column_cache]
+            if missing and is_cached(INPUT_FILE_PATH):
+                messages.put(("progress", f"Loading {len(missing)} new column(s)..."))
+                loaded = load_csv(INPUT_FILE_PATH, columns=missing)
+            elif missing:
+                chunks = []
+                rows_read = 0
+                reader = pd.read_csv(INPUT_FILE_PATH, usecols=missing, dtype={f: str for f in missing},
+                                     keep_default_na=False, chunksize=GUI_READ_CHUNK_ROWS)
+                for chunk in reader:
+                    chunks.append(chunk)
+                    rows_read += len(chunk)
+                    messages.put(("progress", f"Reading {len(missing)} new column(s)... {rows_read:,} rows"))
+                loaded = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=missing)
+            for feature in missing:
+                column_cache[feature] = loaded[feature]
             
-            # Select only the chosen features
-            df_selected = df[selected_features]
+            messages.put(("progress", f"Writing dataset for {team_name}..."))
+            df_selected = pd.DataFrame({f: column_cache[f] for f in selected_features})
             
             # Create output directory if it doesn't exist
             if not os.path.exists(OUTPUT_DIRECTORY):
@@ -201,39 +235,64 @@ def select_features():
             
             # Save the new CSV
             df_selected.to_csv(output_path, index=False)
+            messages.put(("done", output_path))
+        except Exception as e:
+            messages.put(("error", str(e)))
+    
+    def poll_worker(team_name, selected_features, messages):
+        # Drain worker messages on the Tk main thread, rescheduling until the worker finishes
+        while not messages.empty():
+            kind, payload = messages.get()
+            if kind == "progress":
+                status_label.config(text=payload)
+                continue
+            
+            generate_btn.config(state=tk.NORMAL)
+            if kind == "error":
+                status_label.config(text=f"Error: {payload}")
+                messagebox.showerror("Error", f"Error generating dataset: {payload}")
+                return
             
+            status_label.config(text=f"Dataset for {team_name} saved to {payload}")
             messagebox.showinfo("Success", 
                                f"Dataset for {team_name} created successfully!\n"
-                               f"Location: {output_path}\n"
+                               f"Location: {payload}\n"
                                f"Features: {len(selected_features)}")
+            show_team_summary(team_name, selected_features)
             
-            # Show selected features in the text widget
-            features_text.config(state=tk.NORMAL)
-            features_text.delete(1.0, tk.END)
-            
-            # Separate required and optional features for display
-            req_features = [f for f in selected_features if f in REQUIRED_FEATURES]
-            opt_features = [f for f in selected_features if f not in REQUIRED_FEATURES]
-            
-            features_text.insert(tk.END, f"Features selected for team '{team_name}':\n\n", "header")
-            features_text.insert(tk.END, "Required Features:\n", "subheader")
-            for feature in req_features:
-                features_text.insert(tk.END, f"• {feature}\n", "required")
-                
-            features_text.insert(tk.END, "\nOptional Features:\n", "subheader")
-            if opt_features:
-                for feature in opt_features:
-                    features_text.insert(tk.END, f"• {feature}\n", "optional")
-            else:
-                features_text.insert(tk.END, "None\n", "italic")
-            
-            features_text.config(state=tk.DISABLED)
-                
             # Clear team name for next team
             team_entry.delete(0, tk.END)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error generating dataset: {str(e)}")
+            return
+        
+        root.after(GUI_POLL_INTERVAL_MS, poll_worker, team_name, selected_features, messages)
+    
+    def generate_dataset():
+        # Get selected features
+        selected_features = [feature for feature in features if feature_vars[feature].get() == 1]
+        
+        # Ensure required features are always included
+        for feature in REQUIRED_FEATURES:
+            if feature in features and feature not in selected_features:
+                selected_features.append(feature)
+        
+        team_name = team_entry.get().strip()
+        if not team_name:
+            messagebox.showerror("Error", "Please enter a team name")
+            return
+        
+        # Validate selected features against the loaded header
+        valid_features = [f for f in selected_features if f in features]
+        if len(valid_features) != len(selected_features):
+            invalid_features = set(selected_features) - set(valid_features)
+            messagebox.showwarning("Warning", f"Some features not found in dataset: {', '.join(invalid_features)}\nProceeding with valid features only.")
+            selected_features = valid_features
+        
+        # Load and write on a worker thread so the window stays responsive
+        generate_btn.config(state=tk.DISABLED)
+        status_label.config(text=f"Generating dataset for {team_name}...")
+        messages = queue.Queue()
+        threading.Thread(target=write_team_dataset, args=(team_name, selected_features, messages), daemon=True).start()
+        root.after(GUI_POLL_INTERVAL_MS, poll_worker, team_name, selected_features, messages)
     
     # Create UI elements with improved styling
     main_frame = ttk.Frame(root, padding=20)
@@ -446,56 +505,125 @@ def select_features():
     # Start the GUI
     root.mainloop()
 
+# Rows joined into one string per write when assembling team files
+EXPORT_BLOCK_ROWS = 50000
+
+def _format_csv_column(series):
+    """
+    Render a column to its CSV field text once, the way to_csv would write it
+    (minimal quoting, missing values as empty fields).
+    
+    Returns a list of field strings so team files can be assembled by joining
+    cached text instead of re-serializing the same column for every team.
+    """
+    text = series.astype(str).where(series.notna(), '')
+    needs_quotes = text.str.contains(r'[,"\r\n]', regex=True)
+    if needs_quotes.any():
+        quoted = '"' + text.str.replace('"', '""', regex=False) + '"'
+        text = text.where(~needs_quotes, quoted)
+    return text.tolist()
+
+def _write_team_header(f, features):
+    f.write(','.join(_format_csv_column(pd.Series(features, dtype=object))) + os.linesep)
+
+def _write_team_rows(f, features, formatted_columns):
+    # Join the pre-formatted column text into rows, a block of rows per write
+    rows = map(','.join, zip(*(formatted_columns[feature] for feature in features)))
+    while True:
+        block = list(islice(rows, EXPORT_BLOCK_ROWS))
+        if not block:
+            break
+        f.write(os.linesep.join(block) + os.linesep)
+
+def _write_team_csv(output_path, features, formatted_columns):
+    # Assemble the team file from pre-formatted column text
+    with open(output_path, 'w', newline='') as f:
+        _write_team_header(f, features)
+        _write_team_rows(f, features, formatted_columns)
+
+def _resolve_team_features(teams_config, columns):
+    """
+    Add the required features to every team and drop features missing from the data.
+    
+    Returns a tuple (dict of team name -> feature list, dict of team name ->
+    warning/error messages); teams left without any valid feature are omitted
+    from the first dict.
+    """
+    results = {}
+    team_features = {}
+    for team_name, selected_features in teams_config.items():
+        # Always include required features
+        selected_features = list(selected_features)
+        for feature in REQUIRED_FEATURES:
+            if feature in columns and feature not in selected_features:
+                selected_features.append(feature)
+        
+        # Validate features
+        invalid_features = [f for f in selected_features if f not in columns]
+        if invalid_features:
+            results[team_name] = [f"Warning for {team_name}: Invalid features: {invalid_features}"]
+            # Remove invalid features
+            selected_features = [f for f in selected_features if f in columns]
+        
+        if not selected_features:
+            results.setdefault(team_name, []).append(f"Error for {team_name}: No valid features selected")
+            continue
+        
+        team_features[team_name] = selected_features
+    return team_features, results
+
 # Command-line version for batch processing (updated to always include required features)
-def generate_team_datasets(teams_config):
+def generate_team_datasets(teams_config, input_file=INPUT_FILE_PATH, output_directory=OUTPUT_DIRECTORY, max_workers=None):
+    """
+    Write one dataset per team from a single read of the source CSV.
+    
+    Every column used by any team is formatted to CSV text once, then each
+    team's file is assembled by joining the cached column text. Team files
+    are written in parallel on a thread pool.
+    
+    Parameters:
+    - teams_config: Dict of team name -> list of selected features
+    - input_file: Source CSV (default: INPUT_FILE_PATH)
+    - output_directory: Folder for the team datasets (default: OUTPUT_DIRECTORY)
+    - max_workers: Number of writer threads (default: ThreadPoolExecutor's default)
+    """
     try:
-        # Read the CSV
-        df = pd.read_csv(INPUT_FILE_PATH)
+        # Read the CSV (via the columnar cache)
+        with stage("dataset_creator.load") as s:
+            df = load_csv(input_file)
+            s.rows = len(df)
         
         # Create output directory if it doesn't exist
-        if not os.path.exists(OUTPUT_DIRECTORY):
-            os.makedirs(OUTPUT_DIRECTORY)
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+        
+        # Resolve each team's feature list
+        team_features, results = _resolve_team_features(teams_config, df.columns)
         
-        results = []
+        # Format every column any team needs exactly once
+        needed_columns = {f for features in team_features.values() for f in features}
+        with stage("dataset_creator.format", rows=len(df)):
+            formatted_columns = {col: _format_csv_column(df[col]) for col in df.columns if col in needed_columns}
         
-        # Process each team
-        for team_name, selected_features in teams_config.items():
+        def export_team(team_name):
+            features = team_features[team_name]
             try:
-                # Always include required features
-                for feature in REQUIRED_FEATURES:
-                    if feature in df.columns and feature not in selected_features:
-                        selected_features.append(feature)
-                
-                # Validate features
-                invalid_features = [f for f in selected_features if f not in df.columns]
-                if invalid_features:
-                    results.append(f"Warning for {team_name}: Invalid features: {invalid_features}")
-                    # Remove invalid features
-                    selected_features = [f for f in selected_features if f in df.columns]
-                
-                if not selected_features:
-                    results.append(f"Error for {team_name}: No valid features selected")
-                    continue
-                
-                # Select only the chosen features
-                df_selected = df[selected_features]
-                
-                # Define output path
-                output_path = os.path.join(OUTPUT_DIRECTORY, f"{team_name}.csv")
-                
-                # Save the new CSV
-                df_selected.to_csv(output_path, index=False)
-                
-                results.append(f"Success: Dataset for {team_name} created with {len(selected_features)} features")
-                
+                output_path = os.path.join(output_directory, f"{team_name}.csv")
+                _write_team_csv(output_path, features, formatted_columns)
+                return f"Success: Dataset for {team_name} created with {len(features)} features"
             except Exception as e:
-                results.append(f"Error for {team_name}: {str(e)}")
+                return f"Error for {team_name}: {str(e)}"
+        
+        with stage("dataset_creator.write", rows=len(df)), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for team_name, result in zip(team_features, executor.map(export_team, team_features)):
+                results.setdefault(team_name, []).append(result)
         
         # Print results
         print("\n=== Team Dataset Generation Results ===")
-        for result in results:
-            print(result)
-        print(f"\nAll datasets saved to: {os.path.abspath(OUTPUT_DIRECTORY)}")
+        for team_name in teams_config:
+            for result in results.get(team_name, []):
+                print(result)
+        print(f"\nAll datasets saved to: {os.path.abspath(output_directory)}")
             
     except Exception as e:
         print(f"Error reading source file: {str(e)}")
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# Lower bound of each impact level on the combined (0-1) score
+IMPACT_LEVELS = [
+    (0.8, "High Impact"),
+    (0.5, "Medium-High Impact"),
+    (0.3, "Medium Impact"),
+    (0.1, "Low-Medium Impact"),
+]
+LOWEST_IMPACT = "Low Impact"
+
+
+def impact_level(scores):
+    """Map combined scores to their impact level labels."""
+    scores = np.asarray(scores, dtype=float)
+    return np.select([scores >= bound for bound, _ in IMPACT_LEVELS],
+                     [label for _, label in IMPACT_LEVELS], default=LOWEST_IMPACT)
+
+
+def aggregate_to_source(importance, source_columns=None, separator="_", how="sum"):
+    """
+    Fold importances of engineered features back onto their source columns.
+
+    One-hot names such as "State_Alabama" belong to "State". With
+    source_columns the longest column name that equals the feature or
+    prefixes it (followed by the separator) wins; without it the name is cut
+    at the first separator.
+
+    Parameters:
+    importance (DataFrame): Feature and Importance columns
+    source_columns (list): Original column names (default: None)
+    separator (str): Separator between column name and value (default: "_")
+    how (str): Aggregation of the pieces, e.g. "sum" or "max" (default: "sum")
+
+    Returns:
+    DataFrame with one Feature/Importance row per source column
+    """
+    features = importance["Feature"].astype(str)
+    if source_columns is None:
+        source = features.str.split(separator, n=1).str[0]
+    else:
+        source = features.copy()
+        for col in sorted(source_columns, key=len):
+            match = (features == col) | features.str.startswith(col + separator)
+            source = source.mask(match, col)
+    return (importance["Importance"].groupby(source.to_numpy()).agg(how)
+            .rename_axis("Feature").reset_index())
+
+
+def _normalized_scores(name, importance, aggregate, source_columns):
+    if aggregate:
+        importance = aggregate_to_source(importance, source_columns, how=aggregate)
+    scores = importance.set_index("Feature")["Importance"].astype(float)
+    max_val = scores.max()
+    if max_val > 0:
+        scores = scores / max_val
+    return scores.rename(f"{name}_Score")
+
+
+def combine_importances(sources, method="mean", aggregate=None, source_columns=None):
+    """
+    Normalize and merge any number of importance tables in one step.
+
+    Each source is scaled to a maximum of 1 and the tables are joined on
+    Feature (an outer join, so a feature missing from one method keeps the
+    scores of the others). The inputs are not modified.
+
+    Parameters:
+    sources (dict): Method name -> DataFrame with Feature and Importance
+        columns; scores come out as "<name>_Score"
+    method (str): "mean" sorts by the average normalized score, "rank" by
+        the average rank across methods (1 = most important) (default: "mean")
+    aggregate (str): Fold one-hot feature names back onto their source
+        columns with this aggregation ("sum", "max", ...) first (default: None)
+    source_columns (list): Source column names for the aggregation
+
+    Returns:
+    DataFrame with Feature, one score column per method, Average_Score,
+    Average_Rank (method="rank") and Impact_Level, most important first
+    """
+    if method not in ("mean", "rank"):
+        raise ValueError(f"Unknown method {method!r}; use 'mean' or 'rank'")
+
+    scores = pd.concat([_normalized_scores(name, importance, aggregate, source_columns)
+                        for name, importance in sources.items()], axis=1, join="outer")
+    combined = scores.rename_axis("Feature").reset_index()
+    score_cols = list(scores.columns)
+
+    combined["Average_Score"] = combined[score_cols].mean(axis=1)
+    if method == "rank":
+        combined["Average_Rank"] = combined[score_cols].rank(ascending=False).mean(axis=1)
+        combined = combined.sort_values(["Average_Rank", "Average_Score"], ascending=[True, False])
+    else:
+        combined = combined.sort_values("Average_Score", ascending=False)
+    combined["Impact_Level"] = impact_level(combined["Average_Score"])
+    return combined.reset_index(drop=True)
+
+
+def combined_feature_importance(rf_importance, gb_importance, mi_importance, n_features=15, method="mean"):
+    """
+    Combine the notebook's Random Forest, Gradient Boosting and Mutual
+    Information importances into RF_Score/GB_Score/MI_Score, Average_Score
+    and Impact_Level columns.
+    """
+    return combine_importances({"RF": rf_importance, "GB": gb_importance, "MI": mi_importance}, method=method)
@@ -0,0 +1,177 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.feature_selection import mutual_info_classif
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from threadpoolctl import threadpool_limits
+
+from feature_ranking import combine_importances
+from model_zoo import plan_thread_budget
+
+# Importance methods, named like the score columns of combined_feature_importance
+METHODS = ("RF", "GB", "MI")
+METHOD_TITLES = {"RF": "Random Forest Importance", "GB": "Gradient Boosting Importance",
+                 "MI": "Mutual Information"}
+
+# Identifier columns left out of the features
+ID_COLUMNS = ["ID", "CNTYFIPS", "Ori"]
+
+# Features and target of a pool worker, set once by _init_worker
+_worker_data = None
+
+
+def split_features(data, target_col='Solved'):
+    """Features (without target and identifier columns) and target of an encoded frame."""
+    X = data.drop(columns=[target_col] + ID_COLUMNS, errors='ignore')
+    return X, data[target_col]
+
+
+def stratified_sample(y, n_rows, random_state=42):
+    """
+    Positions of a class-stratified sample of n_rows rows (all rows if n_rows is None or too large).
+
+    Classes with a single row cannot be stratified, so their rows are
+    stratified as part of the largest class. When the sample or the rest is
+    smaller than the number of classes, the sample is drawn without
+    stratification.
+    """
+    positions = np.arange(len(y))
+    if n_rows is None or n_rows >= len(y):
+        return positions
+    codes, _ = pd.factorize(np.asarray(y), use_na_sentinel=False)
+    counts = np.bincount(codes)
+    stratify = np.where(counts[codes] > 1, codes, counts.argmax())
+    n_strata = len(np.unique(stratify))
+    if min(n_rows, len(y) - n_rows) < n_strata:
+        stratify = None
+    sample, _ = train_test_split(positions, train_size=n_rows, stratify=stratify, random_state=random_state)
+    return np.sort(sample)
+
+
+def _gbm_model(gbm, n_threads):
+    if gbm == "hist":
+        # Histogram-based, multithreaded boosting; gain importance is comparable to sklearn's
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(n_estimators=100, random_state=42, n_jobs=n_threads,
+                              importance_type="gain", verbose=-1)
+    return GradientBoostingClassifier(n_estimators=100, random_state=42)
+
+
+def method_importance(method, X, y, n_threads=1, gbm="hist"):
+    """
+    Feature importance of one method on (X, y).
+
+    RF and GB fit on a 70/30 split and report the holdout accuracy, like the
+    notebook; MI uses all rows.
+
+    Returns:
+    Tuple (DataFrame with Feature and Importance sorted descending, accuracy or None)
+    """
+    accuracy = None
+    with threadpool_limits(limits=n_threads):
+        if method == "MI":
+            importances = mutual_info_classif(X, y, random_state=42, n_jobs=n_threads)
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+            if method == "RF":
+                model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_threads)
+            else:
+                model = _gbm_model(gbm, n_threads)
+            model.fit(X_train, y_train)
+            accuracy = accuracy_score(y_test, model.predict(X_test))
+            importances = model.feature_importances_
+
+    importance = pd.DataFrame({'Feature': X.columns, 'Importance': np.asarray(importances, dtype=float)})
+    return importance.sort_values('Importance', ascending=False).reset_index(drop=True), accuracy
+
+
+def _init_worker(X, y):
+    # Runs once per worker process; later tasks only send row positions
+    global _worker_data
+    _worker_data = (X, y)
+
+
+def _importance_in_worker(method, positions, n_threads, gbm):
+    X, y = _worker_data
+    start = time.perf_counter()
+    importance, accuracy = method_importance(method, X.iloc[positions], y.iloc[positions], n_threads, gbm)
+    return method, importance, accuracy, time.perf_counter() - start
+
+
+def run_feature_selection(data, target_col='Solved', n_features=15, methods=METHODS, gbm="hist",
+                          sample_size=50000, growth=2, min_overlap=0.9, n_cores=None, random_state=42):
+    """
+    Run the importance methods concurrently on growing stratified samples
+    until the combined top features stop changing.
+
+    Each round draws a stratified sample, runs RF, GB and MI in parallel
+    worker processes (cores split between them) and combines the results.
+    When the top n_features of two consecutive rounds overlap by at least
+    min_overlap the ranking is considered stable; otherwise the sample grows
+    by `growth`, up to the full data.
+
+    Parameters:
+    data (DataFrame): Label-encoded data, e.g. from preprocess_data
+    target_col (str): Target column (default: 'Solved')
+    n_features (int): Size of the top feature set checked for convergence
+    methods (tuple): Methods to run, out of "RF", "GB", "MI"
+    gbm (str): "hist" for histogram-based LightGBM, "exact" for sklearn's
+        GradientBoostingClassifier (default: "hist")
+    sample_size (int): Rows in the first sample; None uses all rows
+    growth (float): Sample growth factor between rounds
+    min_overlap (float): Fraction of the top features that must match
+        between rounds (default: 0.9)
+    n_cores (int): Cores to use (default: os.cpu_count())
+    random_state (int): Seed of the sampling
+
+    Returns:
+    Tuple (dict of method -> importance DataFrame, combined ranking DataFrame)
+    """
+    X, y = split_features(data, target_col)
+    n_workers, budget = plan_thread_budget(dict.fromkeys(methods), n_cores)
+
+    previous_top = None
+    n_rows = sample_size
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(X, y)) as executor:
+        while True:
+            positions = stratified_sample(y, n_rows, random_state)
+            print(f"Computing feature importance on {len(positions)} of {len(X)} rows")
+            futures = [executor.submit(_importance_in_worker, method, positions, budget[method], gbm)
+                       for method in methods]
+
+            importances = {}
+            for future in futures:
+                method, importance, accuracy, elapsed = future.result()
+                importances[method] = importance
+                accuracy_text = f", accuracy {accuracy:.4f}" if accuracy is not None else ""
+                print(f"- {METHOD_TITLES.get(method, method)}: {elapsed:.1f}s{accuracy_text}")
+
+            combined = combine_importances(importances)
+            top = set(combined.head(n_features)['Feature'])
+            if previous_top is not None:
+                overlap = len(top & previous_top) / max(1, len(top))
+                print(f"Top {n_features} overlap with the previous sample: {overlap:.0%}")
+                if overlap >= min_overlap:
+                    break
+            if len(positions) == len(X):
+                break
+            previous_top = top
+            n_rows = int(len(positions) * growth)
+
+    return importances, combined
+
+
+def plot_importance(importance, title, n_features=15):
+    """Bar plot of the top features of one importance table."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 8))
+    sns.barplot(x='Importance', y='Feature', data=importance.head(n_features))
+    plt.title(f'Top {n_features} Features - {title}')
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,188 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource  # peak RSS of the process (not available on Windows)
+except ImportError:
+    resource = None
+
+# Set CIPHER_PROFILE=1 to record stage timings. Records go to the JSON lines
+# file named by CIPHER_PROFILE_OUTPUT (default: stage_profile.jsonl), and the
+# stage named by CIPHER_PROFILE_STAGE is also run under cProfile, dumped to
+# <stage>.prof next to that file.
+PROFILE_ENV = "CIPHER_PROFILE"
+PROFILE_OUTPUT_ENV = "CIPHER_PROFILE_OUTPUT"
+PROFILE_STAGE_ENV = "CIPHER_PROFILE_STAGE"
+DEFAULT_OUTPUT = "stage_profile.jsonl"
+
+_settings = {
+    "enabled": os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on"),
+    "output": os.environ.get(PROFILE_OUTPUT_ENV) or DEFAULT_OUTPUT,
+    "profile_stage": os.environ.get(PROFILE_STAGE_ENV) or None,
+}
+_write_lock = threading.Lock()
+_local = threading.local()
+
+# tracemalloc is process-global: open stages of all threads share one start/stop
+# (refcounted under _trace_lock), and the peak is only reset while no other
+# thread has a stage open
+_trace_lock = threading.Lock()
+_trace = {"open_stages": 0, "started": False}
+
+
+def enable(output=None, profile_stage=None):
+    """Turn instrumentation on from code (same effect as the environment variables)."""
+    _settings["enabled"] = True
+    if output is not None:
+        _settings["output"] = output
+    if profile_stage is not None:
+        _settings["profile_stage"] = profile_stage
+
+
+def disable():
+    """Turn instrumentation off."""
+    _settings["enabled"] = False
+
+
+def is_enabled():
+    return _settings["enabled"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process in MiB, or None where the
+    resource module is unavailable. ru_maxrss is in KiB on Linux and in
+    bytes on macOS.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+class _NullStage:
+    # Shared do-nothing stage used while instrumentation is off
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """One timed stage; set .rows inside the block to record a row count."""
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self._profiler = None
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        with _trace_lock:
+            # Trace allocations only while some stage is open
+            if _trace["open_stages"] == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _trace["started"] = True
+            # Fold the peak so far into the enclosing stage before resetting it for this one
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, tracemalloc.get_traced_memory()[1])
+            if _trace["open_stages"] == len(stack):
+                tracemalloc.reset_peak()
+            _trace["open_stages"] += 1
+        self._peak = 0
+        stack.append(self)
+
+        if self.name == _settings["profile_stage"]:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        if self._profiler is not None:
+            self._profiler.disable()
+            output_dir = os.path.dirname(os.path.abspath(_settings["output"]))
+            self._profiler.dump_stats(os.path.join(output_dir, f"{self.name}.prof"))
+
+        stack = _local.stack
+        stack.pop()
+        with _trace_lock:
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            _trace["open_stages"] -= 1
+            if _trace["open_stages"] == 0 and _trace["started"]:
+                tracemalloc.stop()
+                _trace["started"] = False
+        if stack:
+            stack[-1]._peak = max(stack[-1]._peak, peak)
+
+        record = {
+            "stage": self.name,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_mb": round(peak / (1024 * 1024), 3),
+            "rows": self.rows,
+            "ok": exc_type is None,
+            "pid": os.getpid(),
+            "time": time.time(),
+        }
+        with _write_lock, open(_settings["output"], "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return False
+
+
+def stage(name, rows=None):
+    """
+    Context manager timing one stage of a script.
+
+    Records wall time, CPU time, tracemalloc peak (MiB) and the row count
+    as one JSON line. tracemalloc counts the whole process, so while stages
+    of other threads overlap this one (e.g. the export writer threads), its
+    peak is the process peak over that time, not this stage's alone. When
+    instrumentation is off this returns a shared no-op object, so leaving
+    the calls in place costs next to nothing.
+
+        with stage("null_adder.load") as s:
+            df = load_csv(path)
+            s.rows = len(df)
+    """
+    if not _settings["enabled"]:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+
+def instrumented(name=None, rows=None):
+    """
+    Decorator form of stage(); `rows` may be a function of the return value
+    giving the row count.
+    """
+    def decorator(func):
+        stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings["enabled"]:
+                return func(*args, **kwargs)
+            with _Stage(stage_name, None) as s:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,117 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Filled in for missing text values before encoding, as in the notebook
+MISSING_TEXT = 'Unknown'
+
+# Filled in for missing numeric values
+MISSING_NUMBER = 0
+
+# Code for values that are not in a column's vocabulary
+UNSEEN_CODE = -1
+
+
+def _code_dtype(n_values):
+    # Smallest signed integer type that holds every code plus UNSEEN_CODE
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _is_text(column):
+    return not pd.api.types.is_numeric_dtype(column.dtype) or isinstance(column.dtype, pd.CategoricalDtype)
+
+
+def fit_encode(data, columns=None):
+    """
+    Label-encode the text columns and learn their vocabularies in one pass.
+
+    Missing text becomes 'Unknown' and missing numbers become 0. Codes are
+    the positions in the sorted vocabulary, so they match sklearn's
+    LabelEncoder, but are computed with pd.factorize and stored in the
+    smallest integer type. Only the encoded columns are new arrays; the
+    input frame is not copied or modified.
+
+    Parameters:
+    data (DataFrame): Data to encode
+    columns (list): Text columns to encode (default: every non-numeric column)
+
+    Returns:
+    Tuple (encoded DataFrame, dict of column -> vocabulary list)
+    """
+    if columns is None:
+        columns = [col for col in data.columns if _is_text(data[col])]
+    columns = set(columns)
+
+    encoded, vocabularies = {}, {}
+    for col in data.columns:
+        column = data[col]
+        if col in columns:
+            codes, uniques = pd.factorize(column, sort=True)
+            uniques = uniques.tolist()
+            if (codes == -1).any():
+                # Missing values (code -1) become 'Unknown', slotted into its sorted position
+                if MISSING_TEXT in uniques:
+                    position = uniques.index(MISSING_TEXT)
+                else:
+                    position = int(np.searchsorted(np.array(uniques, dtype=object), MISSING_TEXT))
+                    uniques.insert(position, MISSING_TEXT)
+                    codes[codes >= position] += 1
+                codes[codes == -1] = position
+            encoded[col] = codes.astype(_code_dtype(len(uniques)))
+            vocabularies[col] = uniques
+        else:
+            encoded[col] = column.fillna(MISSING_NUMBER) if column.hasnans else column
+    return pd.DataFrame(encoded, index=data.index), vocabularies
+
+
+def encode(data, vocabularies):
+    """
+    Encode new data with vocabularies from fit_encode, without refitting.
+
+    Values missing from a column's vocabulary get UNSEEN_CODE (-1); missing
+    text is encoded as 'Unknown' when the vocabulary has it.
+
+    Returns:
+    Encoded DataFrame
+    """
+    encoded = {}
+    for col in data.columns:
+        column = data[col]
+        if col in vocabularies:
+            vocabulary = vocabularies[col]
+            # get_indexer returns -1 (UNSEEN_CODE) for values not in the vocabulary
+            codes = pd.Index(vocabulary).get_indexer(column).astype(_code_dtype(len(vocabulary)))
+            if column.hasnans:
+                missing_code = vocabulary.index(MISSING_TEXT) if MISSING_TEXT in vocabulary else UNSEEN_CODE
+                codes[column.isna().to_numpy()] = missing_code
+            encoded[col] = codes
+        else:
+            encoded[col] = column.fillna(MISSING_NUMBER) if column.hasnans else column
+    return pd.DataFrame(encoded, index=data.index)
+
+
+def decode(encoded, vocabularies):
+    """Turn codes back into the original values; UNSEEN_CODE becomes missing."""
+    decoded = {}
+    for col in encoded.columns:
+        if col in vocabularies:
+            decoded[col] = pd.Categorical.from_codes(encoded[col].to_numpy(), categories=vocabularies[col])
+        else:
+            decoded[col] = encoded[col]
+    return pd.DataFrame(decoded, index=encoded.index)
+
+
+def save_vocabularies(vocabularies, path):
+    """Write the vocabularies to a JSON file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(vocabularies, f, ensure_ascii=False, indent=1)
+
+
+def load_vocabularies(path):
+    """Read vocabularies written by save_vocabularies."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
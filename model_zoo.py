@@ -0,0 +1,326 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.naive_bayes import GaussianNB
+from threadpoolctl import threadpool_limits
+
+from instrumentation import peak_rss_mb
+
+# Rows densified at a time when GaussianNB meets a sparse matrix
+DENSE_BLOCK_ROWS = 10000
+
+# Constructor arguments the model libraries use for their thread count
+THREAD_PARAMS = ("n_jobs", "thread_count", "nthread")
+
+# Libraries whose models can take category columns directly
+NATIVE_CATEGORICAL_LIBRARIES = ("lightgbm", "xgboost", "catboost")
+
+# Training data of a pool worker, set once by _init_worker
+_worker_data = None
+
+
+def _thread_param(model):
+    # Name of the model's thread-count argument, or None for single-threaded models
+    params = model.get_params()
+    for param in THREAD_PARAMS:
+        if param in params:
+            return param
+    # CatBoost only reports explicitly set parameters
+    if type(model).__name__.startswith("CatBoost"):
+        return "thread_count"
+    return None
+
+
+def plan_thread_budget(models, n_cores=None, max_workers=None):
+    """
+    Decide how many models run at once and how many threads each one gets.
+
+    Every worker process gets an equal share of the cores. Models with a
+    thread-count argument (n_jobs / thread_count / nthread) use that share;
+    the BLAS/OpenMP pools of every model are capped to it as well, so the
+    pool never runs more threads than there are cores.
+
+    Parameters:
+    models (dict): Model name -> estimator
+    n_cores (int): Cores to use (default: os.cpu_count())
+    max_workers (int): Upper bound on concurrent models (default: n_cores)
+
+    Returns:
+    Tuple (n_workers, dict of model name -> thread budget)
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    n_workers = max(1, min(len(models), max_workers or n_cores, n_cores))
+    threads = max(1, n_cores // n_workers)
+    return n_workers, {name: threads for name in models}
+
+
+def _fit_gaussian_nb(model, X, y):
+    # Fit on dense row blocks instead of densifying the whole matrix
+    classes = np.unique(y)
+    for start in range(0, X.shape[0], DENSE_BLOCK_ROWS):
+        stop = start + DENSE_BLOCK_ROWS
+        model.partial_fit(X[start:stop].toarray(), y[start:stop], classes=classes)
+
+    # partial_fit takes the variance smoothing from the first block; use the
+    # whole matrix like fit() does
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    var = np.asarray(X.multiply(X).mean(axis=0)).ravel() - mean ** 2
+    epsilon = model.var_smoothing * var.max()
+    model.var_ += epsilon - model.epsilon_
+    model.epsilon_ = epsilon
+    return model
+
+
+def prepare_native_categorical(X_train, X_test, categorical_cols):
+    """
+    Build model input for the native categorical path: category columns with
+    integer codes instead of one-hot columns.
+
+    Categories come from the training split; test values not seen in
+    training become missing. All other columns are converted to numbers.
+
+    Returns:
+    Tuple (X_train_native, X_test_native) of DataFrames
+    """
+    X_train_native, X_test_native = pd.DataFrame(index=X_train.index), pd.DataFrame(index=X_test.index)
+    for col in X_train.columns:
+        if col in categorical_cols:
+            train_values, test_values = X_train[col].astype(str), X_test[col].astype(str)
+            X_train_native[col] = train_values.astype("category")
+            categories = X_train_native[col].cat.categories
+            X_test_native[col] = pd.Categorical(test_values.where(test_values.isin(categories)), categories=categories)
+        else:
+            X_train_native[col] = pd.to_numeric(X_train[col], errors='coerce')
+            X_test_native[col] = pd.to_numeric(X_test[col], errors='coerce')
+    return X_train_native, X_test_native
+
+
+def _native_inputs(model, X_train, X_test):
+    # Hand category columns to the library's own categorical support
+    library = type(model).__module__.split(".")[0]
+    categorical_cols = [col for col in X_train.columns if isinstance(X_train[col].dtype, pd.CategoricalDtype)]
+    if library == "lightgbm":
+        return X_train, X_test, {"categorical_feature": categorical_cols}
+    if library == "xgboost":
+        model.set_params(enable_categorical=True, tree_method="hist")
+        return X_train, X_test, {}
+    if library == "catboost":
+        # CatBoost wants integer or string categories: pass the codes (-1 = missing)
+        as_codes = lambda X: X.assign(**{col: X[col].cat.codes for col in categorical_cols})
+        return as_codes(X_train), as_codes(X_test), {"cat_features": categorical_cols}
+    raise ValueError(f"{type(model).__name__} has no native categorical support; "
+                     f"use one of {NATIVE_CATEGORICAL_LIBRARIES}")
+
+
+def _nbytes(X):
+    # In-memory size of a model input
+    if sp.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    if isinstance(X, pd.DataFrame):
+        return int(X.memory_usage(deep=True).sum())
+    return X.nbytes
+
+
+def _predict(model, X):
+    if isinstance(model, GaussianNB) and sp.issparse(X):
+        return np.concatenate([model.predict(X[start:start + DENSE_BLOCK_ROWS].toarray())
+                               for start in range(0, X.shape[0], DENSE_BLOCK_ROWS)])
+    return model.predict(X)
+
+
+def fit_and_score(name, model, X_train, y_train, X_test, y_test, n_threads=1, native=False):
+    """
+    Fit one model with a fixed thread budget and score it on the test set.
+
+    With native=True, X_train/X_test are the DataFrames from
+    prepare_native_categorical and the model uses its library's categorical
+    support instead of one-hot columns.
+
+    Returns:
+    Tuple (result row, fitted model)
+    """
+    param = _thread_param(model)
+    if param is not None:
+        model.set_params(**{param: n_threads})
+    fit_params = {}
+    if native:
+        X_train, X_test, fit_params = _native_inputs(model, X_train, X_test)
+
+    with threadpool_limits(limits=n_threads):
+        start = time.perf_counter()
+        if isinstance(model, GaussianNB) and sp.issparse(X_train):
+            _fit_gaussian_nb(model, X_train, y_train)
+        else:
+            model.fit(X_train, y_train, **fit_params)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = _predict(model, X_test)
+        predict_time = time.perf_counter() - start
+
+    # Calculate metrics
+    accuracy = accuracy_score(y_test, y_pred)
+    report = classification_report(y_test, y_pred, output_dict=True)
+
+    result = {
+        'Model': name,
+        'Accuracy': accuracy,
+        'Precision': report['weighted avg']['precision'],
+        'Recall': report['weighted avg']['recall'],
+        'F1-Score': report['weighted avg']['f1-score'],
+        'Fit Time (s)': fit_time,
+        'Predict Time (s)': predict_time,
+        'Threads': n_threads,
+        'Input': 'native' if native else 'one-hot',
+        'Input MB': _nbytes(X_train) / 1e6,
+    }
+    return result, model
+
+
+def _init_worker(X_train, y_train, X_test, y_test, native_data=None):
+    # Runs once per worker process, so the data is sent once per worker, not per model
+    global _worker_data
+    _worker_data = (X_train, y_train, X_test, y_test, native_data)
+
+
+def _fit_in_worker(name, model, n_threads, native=False):
+    X_train, y_train, X_test, y_test, native_data = _worker_data
+    if native:
+        X_train, X_test = native_data
+    return fit_and_score(name, model, X_train, y_train, X_test, y_test, n_threads, native)
+
+
+def train_and_evaluate(models, X_train, y_train, X_test, y_test, n_cores=None, max_workers=None,
+                       native=(), native_data=None):
+    """
+    Train and evaluate independent models concurrently.
+
+    Models run in a process pool sized by plan_thread_budget. The fitted
+    models replace the unfitted ones in `models`, so later cells can keep
+    using models[best_model_name].
+
+    Parameters:
+    models (dict): Model name -> estimator
+    X_train, y_train, X_test, y_test: Train/test split (X may be sparse)
+    n_cores (int): Cores to use (default: os.cpu_count())
+    max_workers (int): Upper bound on concurrent models (default: n_cores;
+        1 trains everything in this process)
+    native (iterable): Names of models (LightGBM, XGBoost, CatBoost) to train
+        on native categorical input instead of the one-hot matrix
+    native_data (tuple): (X_train_native, X_test_native) from
+        prepare_native_categorical, required when `native` is not empty
+
+    Returns:
+    DataFrame with Accuracy/Precision/Recall/F1-Score plus fit and predict
+    wall time per model, sorted by Accuracy
+    """
+    native = set(native)
+    if native and native_data is None:
+        raise ValueError("native_data is required when models use native categorical input")
+    n_workers, budget = plan_thread_budget(models, n_cores, max_workers)
+    print(f"Training {len(models)} models on {n_workers} worker(s)")
+    results = []
+
+    def record(result, fitted):
+        models[result['Model']] = fitted
+        results.append(result)
+        print(f"{result['Model']} - Accuracy: {result['Accuracy']:.4f} "
+              f"(fit {result['Fit Time (s)']:.1f}s, predict {result['Predict Time (s)']:.1f}s)")
+
+    if n_workers == 1:
+        _init_worker(X_train, y_train, X_test, y_test, native_data)
+        for name, model in models.items():
+            print(f"Training {name}...")
+            record(*_fit_in_worker(name, model, budget[name], name in native))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(X_train, y_train, X_test, y_test, native_data)) as executor:
+            futures = [executor.submit(_fit_in_worker, name, model, budget[name], name in native)
+                       for name, model in models.items()]
+            for future in as_completed(futures):
+                record(*future.result())
+
+    return pd.DataFrame(results).sort_values('Accuracy', ascending=False).reset_index(drop=True)
+
+
+def _measured_fit(name, model, X_train, y_train, X_test, y_test, n_threads, native):
+    # Runs in a freshly spawned process, so the peak RSS belongs to this fit alone
+    result, _ = fit_and_score(name, model, X_train, y_train, X_test, y_test, n_threads, native)
+    peak = peak_rss_mb()
+    if peak is not None:
+        result['Peak RSS MB'] = peak
+    return result
+
+
+def compare_input_modes(models, X_train, y_train, X_test, y_test, native_data, n_threads=None):
+    """
+    Train each gradient booster on the one-hot matrix and on native
+    categorical input and compare speed and memory.
+
+    Every run gets its own spawned (not forked) process, so that peak RSS
+    is measured per run and does not include this process's footprint.
+
+    Parameters:
+    models (dict): Model name -> LightGBM / XGBoost / CatBoost estimator
+    X_train, X_test: One-hot encoded train/test matrices
+    y_train, y_test: Targets
+    native_data (tuple): (X_train_native, X_test_native) from prepare_native_categorical
+    n_threads (int): Threads per run (default: os.cpu_count())
+
+    Returns:
+    DataFrame with one row per model and input mode
+    """
+    n_threads = n_threads or os.cpu_count() or 1
+    results = []
+    for name, model in models.items():
+        for native, (train, test) in ((False, (X_train, X_test)), (True, native_data)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(_measured_fit, name, clone(model), train, y_train, test, y_test,
+                                         n_threads, native).result()
+            results.append(result)
+            print(f"{name} ({result['Input']}) - Accuracy: {result['Accuracy']:.4f}, "
+                  f"fit {result['Fit Time (s)']:.1f}s, input {result['Input MB']:.1f} MB")
+
+    results = pd.DataFrame(results)
+    columns = [col for col in ('Fit Time (s)', 'Predict Time (s)', 'Input MB', 'Peak RSS MB') if col in results]
+    summary = results.pivot(index='Model', columns='Input', values=columns)
+    print("\nOne-hot / native ratio (higher means native is faster or smaller):")
+    print((summary.xs('one-hot', axis=1, level=1) / summary.xs('native', axis=1, level=1)).round(2))
+    return results
+
+
+if __name__ == "__main__":
+    from lightgbm import LGBMClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from xgboost import XGBClassifier
+    from catboost import CatBoostClassifier
+
+    from data_cache import load_csv
+    from preprocessing_cache import build_preprocessor, fit_transform_cached
+
+    # One-hot vs native categorical input for the gradient boosters on Prototype-3
+    data = load_csv('Normal Datasets/Crime Data Prototype-3 (120k).csv', compact=False)
+    X = data.drop(['Solved', 'ID', 'CNTYFIPS', 'Ori'], axis=1)
+    y = LabelEncoder().fit_transform(data['Solved'].astype(str))
+    categorical_cols = X.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
+    numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+    _, X_train_processed, X_test_processed = fit_transform_cached(
+        build_preprocessor(numerical_cols, categorical_cols), X_train, X_test, as_text=True)
+    native_data = prepare_native_categorical(X_train, X_test, categorical_cols)
+
+    boosters = {
+        'XGBoost': XGBClassifier(n_estimators=100, random_state=42, eval_metric='logloss'),
+        'LightGBM': LGBMClassifier(n_estimators=100, random_state=42, verbose=-1),
+        'CatBoost': CatBoostClassifier(n_estimators=100, random_state=42, verbose=0),
+    }
+    print(compare_input_modes(boosters, X_train_processed, y_train, X_test_processed, y_test, native_data))
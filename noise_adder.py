@@ -1,93 +1,98 @@
 import pandas as pd
 import numpy as np
 import random
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
+from instrumentation import instrumented
+
+# Define possible values for categorical features based on your sample
+STATES = ["Alaska", "Alabama", "Arkansas", "Arizona", "California", "Colorado", "Connecticut", 
+          "Delaware", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa",
+          "Kansas", "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan",
+          "Minnesota", "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire",
+          "New Jersey", "New Mexico", "New York", "North Carolina", "North Dakota", "Ohio", 
+          "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
+          "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia",
+          "Wisconsin", "Wyoming"]
+
+AGENCY_TYPES = ["Municipal police", "County police", "Sheriff", "State police", "Special police", 
+               "Constable", "Federal agency", "Other state agency", "Other"]
+
+SOURCES = ["FBI", "Local agency", "State agency", "Other"]
+
+SOLVED_OPTIONS = ["Yes", "No", "Unknown"]
+
+YEARS = [str(y) for y in range(1950, 2025)]  # Pre-convert to strings
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", 
+          "August", "September", "October", "November", "December"]
+
+ACTION_TYPES = ["Normal update", "Adjustment", "Deletion", "Exceptional clearance", "Unfounded"]
+
+HOMICIDE_TYPES = ["Murder and non-negligent manslaughter", "Negligent manslaughter", 
+                 "Justifiable homicide", "Voluntary manslaughter", "Involuntary manslaughter"]
+
+SITUATIONS = ["Single victim/single offender", "Single victim/unknown offender", 
+             "Single victim/multiple offenders", "Multiple victims/single offender",
+             "Multiple victims/multiple offenders", "Multiple victims/unknown offender"]
+
+SEXES = ["Male", "Female", "Unknown"]
+
+RACES = ["White", "Black", "American Indian or Alaskan Native", "Asian", 
+        "Native Hawaiian or Pacific Islander", "Unknown"]
+
+ETHNICS = ["Hispanic or Latino", "Not Hispanic or Latino", "Unknown or not reported"]
+
+WEAPONS = ["Handgun - pistol, revolver, etc", "Rifle", "Shotgun", "Other firearm", 
+          "Knife or cutting instrument", "Blunt object", "Personal weapons (hands, feet, etc.)",
+          "Poison", "Pushed or thrown out window", "Explosives", "Fire", "Narcotics and drugs",
+          "Drowning", "Strangulation - hanging", "Asphyxiation", "Other weapon or not stated"]
+
+RELATIONSHIPS = ["Husband", "Wife", "Mother", "Father", "Son", "Daughter", "Brother", "Sister",
+                "In-law", "Stepfather", "Stepmother", "Stepson", "Stepdaughter", "Other family",
+                "Neighbor", "Acquaintance", "Boyfriend", "Girlfriend", "Ex-husband", "Ex-wife",
+                "Friend", "Other - known to victim", "Stranger", "Relationship not determined"]
+
+CIRCUMSTANCES = ["Rape", "Robbery", "Burglary", "Larceny", "Motor vehicle theft", 
+                "Arson", "Prostitution", "Other sex offense", "Narcotic drug laws",
+                "Gambling", "Other - not specified", "Suspected felony type unknown", 
+                "Lover's triangle", "Child killed by babysitter", "Brawl due to alcohol",
+                "Brawl due to drugs", "Argument over money or property", "Other arguments",
+                "Gangland killing", "Juvenile gang killing", "Institutional killing",
+                "Sniper attack", "Victim shot in hunting accident", "Gun-cleaning death",
+                "Children playing with gun", "Other negligent handling of gun",
+                "Other negligent killing", "Other", "Unknown or not reported"]
+
+# Cities by state for more realistic data
+CITIES_BY_STATE = {
+    "Alaska": ["Anchorage", "Fairbanks", "Juneau", "Sitka", "Ketchikan"],
+    "Alabama": ["Birmingham", "Montgomery", "Mobile", "Huntsville", "Tuscaloosa"],
+    "California": ["Los Angeles", "San Francisco", "San Diego", "Sacramento", "Oakland"],
+    # Add more as needed for other states
+}
+
+# For states not explicitly defined, use a default list
+DEFAULT_CITIES = ["Springfield", "Franklin", "Clinton", "Georgetown", "Salem", "Madison", "Washington"]
+
 def generate_noisy_homicide_records(n_records):
     # Initialize lists to store data
     records = []
     
-    # Define possible values for categorical features based on your sample
-    states = ["Alaska", "Alabama", "Arkansas", "Arizona", "California", "Colorado", "Connecticut", 
-              "Delaware", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa",
-              "Kansas", "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan",
-              "Minnesota", "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire",
-              "New Jersey", "New Mexico", "New York", "North Carolina", "North Dakota", "Ohio", 
-              "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
-              "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia",
-              "Wisconsin", "Wyoming"]
-    
-    agency_types = ["Municipal police", "County police", "Sheriff", "State police", "Special police", 
-                   "Constable", "Federal agency", "Other state agency", "Other"]
-    
-    sources = ["FBI", "Local agency", "State agency", "Other"]
-    
-    solved_options = ["Yes", "No", "Unknown"]
-    
-    years = [str(y) for y in range(1950, 2025)]  # Pre-convert to strings
-    
-    months = ["January", "February", "March", "April", "May", "June", "July", 
-              "August", "September", "October", "November", "December"]
-    
-    action_types = ["Normal update", "Adjustment", "Deletion", "Exceptional clearance", "Unfounded"]
-    
-    homicide_types = ["Murder and non-negligent manslaughter", "Negligent manslaughter", 
-                     "Justifiable homicide", "Voluntary manslaughter", "Involuntary manslaughter"]
-    
-    situations = ["Single victim/single offender", "Single victim/unknown offender", 
-                 "Single victim/multiple offenders", "Multiple victims/single offender",
-                 "Multiple victims/multiple offenders", "Multiple victims/unknown offender"]
-    
-    sexes = ["Male", "Female", "Unknown"]
-    
-    races = ["White", "Black", "American Indian or Alaskan Native", "Asian", 
-            "Native Hawaiian or Pacific Islander", "Unknown"]
-    
-    ethnics = ["Hispanic or Latino", "Not Hispanic or Latino", "Unknown or not reported"]
-    
-    weapons = ["Handgun - pistol, revolver, etc", "Rifle", "Shotgun", "Other firearm", 
-              "Knife or cutting instrument", "Blunt object", "Personal weapons (hands, feet, etc.)",
-              "Poison", "Pushed or thrown out window", "Explosives", "Fire", "Narcotics and drugs",
-              "Drowning", "Strangulation - hanging", "Asphyxiation", "Other weapon or not stated"]
-    
-    relationships = ["Husband", "Wife", "Mother", "Father", "Son", "Daughter", "Brother", "Sister",
-                    "In-law", "Stepfather", "Stepmother", "Stepson", "Stepdaughter", "Other family",
-                    "Neighbor", "Acquaintance", "Boyfriend", "Girlfriend", "Ex-husband", "Ex-wife",
-                    "Friend", "Other - known to victim", "Stranger", "Relationship not determined"]
-    
-    circumstances = ["Rape", "Robbery", "Burglary", "Larceny", "Motor vehicle theft", 
-                    "Arson", "Prostitution", "Other sex offense", "Narcotic drug laws",
-                    "Gambling", "Other - not specified", "Suspected felony type unknown", 
-                    "Lover's triangle", "Child killed by babysitter", "Brawl due to alcohol",
-                    "Brawl due to drugs", "Argument over money or property", "Other arguments",
-                    "Gangland killing", "Juvenile gang killing", "Institutional killing",
-                    "Sniper attack", "Victim shot in hunting accident", "Gun-cleaning death",
-                    "Children playing with gun", "Other negligent handling of gun",
-                    "Other negligent killing", "Other", "Unknown or not reported"]
-    
-    # Cities by state for more realistic data
-    cities_by_state = {
-        "Alaska": ["Anchorage", "Fairbanks", "Juneau", "Sitka", "Ketchikan"],
-        "Alabama": ["Birmingham", "Montgomery", "Mobile", "Huntsville", "Tuscaloosa"],
-        "California": ["Los Angeles", "San Francisco", "San Diego", "Sacramento", "Oakland"],
-        # Add more as needed for other states
-    }
-    
-    # For states not explicitly defined, use a default list
-    default_cities = ["Springfield", "Franklin", "Clinton", "Georgetown", "Salem", "Madison", "Washington"]
-    
     # Generate records
     for i in range(n_records):
         # Create noisy records
-        year = random.choice(years)  # Already a string
-        month = random.choice(months)
-        state = random.choice(states)
+        year = random.choice(YEARS)  # Already a string
+        month = random.choice(MONTHS)
+        state = random.choice(STATES)
         
         # Get cities for this state or use default
-        if state in cities_by_state:
-            city = random.choice(cities_by_state[state])
+        if state in CITIES_BY_STATE:
+            city = random.choice(CITIES_BY_STATE[state])
         else:
-            city = random.choice(default_cities)
+            city = random.choice(DEFAULT_CITIES)
             
         # Create a made-up but realistic ORI (Originating Agency Identifier)
         state_code = state[:2].upper()
@@ -122,20 +127,20 @@ def generate_noisy_homicide_records(n_records):
                 off_age = str(random.randint(4, 10))
         
         # Sometimes introduce conflicting information (e.g., unsolved case with offender details)
-        solved = random.choice(solved_options)
+        solved = random.choice(SOLVED_OPTIONS)
         if solved == "No" and random.random() < 0.7:
             # Unsolved case should typically have unknown offender details
             off_sex = "Unknown"
             off_race = "Unknown"
             off_ethnic = "Unknown or not reported"
         else:
-            off_sex = random.choice(sexes)
-            off_race = random.choice(races)
-            off_ethnic = random.choice(ethnics)
+            off_sex = random.choice(SEXES)
+            off_race = random.choice(RACES)
+            off_ethnic = random.choice(ETHNICS)
             
         # Create inconsistencies in relationship and situation fields
-        situation = random.choice(situations)
-        relationship = random.choice(relationships)
+        situation = random.choice(SITUATIONS)
+        relationship = random.choice(RELATIONSHIPS)
         
         # Create inconsistency between situation and relationship
         if "unknown offender" in situation.lower() and relationship != "Relationship not determined" and random.random() < 0.8:
@@ -144,12 +149,12 @@ def generate_noisy_homicide_records(n_records):
         
         # Deliberately introduce some typos or formatting issues in categorical fields
         if random.random() < 0.05:  # 5% chance of typo
-            weapon = random.choice(weapons)
+            weapon = random.choice(WEAPONS)
             if " " in weapon:
                 parts = weapon.split(" ", 1)
                 weapon = parts[0] + " " + parts[1].replace(" ", "")
         else:
-            weapon = random.choice(weapons)
+            weapon = random.choice(WEAPONS)
             
         # Make victim and offender counts as strings
         vic_count = "0"
@@ -181,26 +186,26 @@ def generate_noisy_homicide_records(n_records):
             "Ori": ori,
             "State": state,
             "Agency": city,
-            "Agentype": random.choice(agency_types),
-            "Source": random.choice(sources),
+            "Agentype": random.choice(AGENCY_TYPES),
+            "Source": random.choice(SOURCES),
             "Solved": solved,
             "Year": year,  # Already a string
             "Month": month,
             "Incident": incident_num,  # Already a string
-            "ActionType": random.choice(action_types),
-            "Homicide": random.choice(homicide_types),
+            "ActionType": random.choice(ACTION_TYPES),
+            "Homicide": random.choice(HOMICIDE_TYPES),
             "Situation": situation,
             "VicAge": vic_age,  # Already a string
-            "VicSex": random.choice(sexes),
-            "VicRace": random.choice(races),
-            "VicEthnic": random.choice(ethnics),
+            "VicSex": random.choice(SEXES),
+            "VicRace": random.choice(RACES),
+            "VicEthnic": random.choice(ETHNICS),
             "OffAge": off_age,  # Already a string
             "OffSex": off_sex,
             "OffRace": off_race,
             "OffEthnic": off_ethnic,
             "Weapon": weapon,
             "Relationship": relationship,
-            "Circumstance": random.choice(circumstances),
+            "Circumstance": random.choice(CIRCUMSTANCES),
             "Subcircum": "",  # Empty string
             "VicCount": vic_count,  # String
             "OffCount": off_count,  # String
@@ -219,8 +224,268 @@ def generate_noisy_homicide_records(n_records):
     
     return df
 
-# Generate the noisy records
-noisy_records = generate_noisy_homicide_records(10000)
+def _weapon_with_typo(weapon):
+    # Same typo rule as the per-row generator: squash the spaces after the first word
+    if " " in weapon:
+        parts = weapon.split(" ", 1)
+        return parts[0] + " " + parts[1].replace(" ", "")
+    return weapon
+
+# Lookup tables used by the vectorized generator. Formatting every possible
+# value once up front lets whole columns be built by indexing instead of
+# calling f-strings row by row.
+_NUM = np.array([str(i) for i in range(131)], dtype=object)
+_DIGITS_5 = np.array([f"{i:05d}" for i in range(100000)], dtype=object)
+_CITY_LISTS = [CITIES_BY_STATE.get(s, DEFAULT_CITIES) for s in STATES]
+_CITY_COUNTS = np.array([len(lst) for lst in _CITY_LISTS])
+_CITY_TABLE = np.array([lst + [""] * (_CITY_COUNTS.max() - len(lst)) for lst in _CITY_LISTS], dtype=object)
+_COUNTY_TABLE = np.array([[f"{c}, {s}" for c in row] for row, s in zip(_CITY_TABLE, STATES)], dtype=object)
+_STATE_CODES = np.array([s[:2].upper() for s in STATES], dtype=object)
+_ID_PREFIXES = np.array([[[f"{y}{m[:3].lower()}{i:03d}" for i in range(21)] for m in MONTHS] for y in YEARS], dtype=object)
+_WEAPON_TYPOS = np.array([_weapon_with_typo(w) for w in WEAPONS], dtype=object)
+_MULTIPLE_VICTIMS = np.array(["multiple victims" in s.lower() for s in SITUATIONS])
+_LOOSE_DAYS = np.array([[f"{m}{d}" for d in range(31)] for m in range(13)], dtype=object)
+_PADDED_DAYS = np.array([[f"{m:02d}{d:02d}" for d in range(29)] for m in range(13)], dtype=object)
+
+
+def generate_noisy_homicide_records_vectorized(n_records, rng=None):
+    """
+    NumPy-backed version of generate_noisy_homicide_records.
+    
+    Every column is drawn as a whole array (categorical codes into the value
+    lists above, normal-distributed ages, MMDDYY file dates) and the text
+    fields are assembled by concatenating object arrays, so there is no
+    per-row Python work. The noise rules are the same as the per-row
+    generator (15% unknown OffAge, 5% suspicious ages, 5% weapon typos,
+    unsolved-case offender masking, bad/future file dates), so the output is
+    statistically equivalent, not row-for-row identical.
+    
+    Parameters:
+    n_records (int): Number of records to generate
+    rng (None, int, np.random.SeedSequence or np.random.Generator): Source of
+        randomness, passed to np.random.default_rng (default: fresh entropy)
+    
+    Returns:
+    DataFrame with the same columns as generate_noisy_homicide_records, all strings
+    """
+    rng = np.random.default_rng(rng)
+    n = n_records
+    
+    def choice(values):
+        values = np.asarray(values, dtype=object)
+        return values[rng.integers(0, len(values), size=n)]
+    
+    month_idx = rng.integers(0, len(MONTHS), size=n)
+    month = np.asarray(MONTHS, dtype=object)[month_idx]
+    state_idx = rng.integers(0, len(STATES), size=n)
+    state = np.asarray(STATES, dtype=object)[state_idx]
+    
+    # Cities: one padded row of candidates per state, indexed by a uniform draw
+    # scaled to the length of that state's own list. "City, State" is looked up
+    # from the same table instead of being concatenated per row.
+    city_idx = (rng.random(n) * _CITY_COUNTS[state_idx]).astype(np.int64)
+    city = _CITY_TABLE[state_idx, city_idx]
+    county_fips = _COUNTY_TABLE[state_idx, city_idx]
+    
+    # ORI: two-letter state prefix plus five random digits
+    ori = _STATE_CODES[state_idx] + _DIGITS_5[rng.integers(0, 100000, size=n)]
+    
+    # ID: year + month abbreviation + zero-padded incident + ORI, with the
+    # (year, month, incident) prefix taken from a precomputed table
+    year_idx = rng.integers(0, len(YEARS), size=n)
+    year = np.asarray(YEARS, dtype=object)[year_idx]
+    incident = rng.integers(1, 21, size=n)
+    unique_id = _ID_PREFIXES[year_idx, month_idx, incident] + ori
+    
+    # Ages: victim age from N(35, 15) truncated like int() and clamped to [0, 120],
+    # offender age loosely correlated with it and clamped to [12, 90]
+    vic_age = np.clip(np.trunc(rng.normal(35, 15, size=n)), 0, 120).astype(np.int64)
+    off_age = np.clip(np.trunc(vic_age * rng.uniform(0.7, 1.3, size=n)), 12, 90).astype(np.int64)
+    off_age_text = _NUM[off_age]
+    off_age_text[rng.random(n) < 0.15] = "Unknown"  # 15% chance of unknown
+    
+    # 5% suspicious ages, split evenly between very old victims and very young offenders
+    suspicious = rng.random(n) < 0.05
+    old_victim = suspicious & (rng.random(n) < 0.5)
+    young_offender = suspicious & ~old_victim
+    vic_age = np.where(old_victim, rng.integers(100, 131, size=n), vic_age)
+    vic_age_text = _NUM[vic_age]
+    off_age_text[young_offender] = _NUM[rng.integers(4, 11, size=n)][young_offender]
+    
+    # Unsolved cases usually have unknown offender details
+    solved = choice(SOLVED_OPTIONS)
+    masked = (solved == "No") & (rng.random(n) < 0.7)
+    off_sex = np.where(masked, "Unknown", choice(SEXES))
+    off_race = np.where(masked, "Unknown", choice(RACES))
+    off_ethnic = np.where(masked, "Unknown or not reported", choice(ETHNICS))
+    
+    situation_idx = rng.integers(0, len(SITUATIONS), size=n)
+    situation = np.asarray(SITUATIONS, dtype=object)[situation_idx]
+    relationship = choice(RELATIONSHIPS)
+    
+    # 5% chance of a typo in the weapon name
+    weapon_idx = rng.integers(0, len(WEAPONS), size=n)
+    weapon = np.where(rng.random(n) < 0.05, _WEAPON_TYPOS[weapon_idx], np.asarray(WEAPONS, dtype=object)[weapon_idx])
+    
+    # Counts are "0" except for the inconsistent multiple-victims-with-one-victim rows
+    one_victim = (rng.random(n) >= 0.1) & (rng.random(n) < 0.05) & _MULTIPLE_VICTIMS[situation_idx]
+    vic_count = np.where(one_victim, "1", "0").astype(object)
+    off_count = np.full(n, "0", dtype=object)
+    
+    # File dates: 5% unpadded/wrong format, then 2% future dates, otherwise MMDDYY.
+    # Month+day prefixes come from small tables; only the year suffix is concatenated.
+    wrong_format = rng.random(n) < 0.05
+    future = ~wrong_format & (rng.random(n) < 0.02)
+    loose = wrong_format | future
+    file_date = _PADDED_DAYS[rng.integers(1, 13, size=n), rng.integers(1, 29, size=n)]
+    file_date[loose] = _LOOSE_DAYS[rng.integers(1, 13, size=n), rng.integers(1, 31, size=n)][loose]
+    file_year = _NUM[rng.integers(70, 100, size=n)]
+    file_year[future] = _NUM[rng.integers(25, 31, size=n)][future]
+    file_date = file_date + file_year
+    
+    columns = {
+        "ID": unique_id,
+        "CNTYFIPS": county_fips,
+        "Ori": ori,
+        "State": state,
+        "Agency": city,
+        "Agentype": choice(AGENCY_TYPES),
+        "Source": choice(SOURCES),
+        "Solved": solved,
+        "Year": year,
+        "Month": month,
+        "Incident": _NUM[incident],
+        "ActionType": choice(ACTION_TYPES),
+        "Homicide": choice(HOMICIDE_TYPES),
+        "Situation": situation,
+        "VicAge": vic_age_text,
+        "VicSex": choice(SEXES),
+        "VicRace": choice(RACES),
+        "VicEthnic": choice(ETHNICS),
+        "OffAge": off_age_text,
+        "OffSex": off_sex,
+        "OffRace": off_race,
+        "OffEthnic": off_ethnic,
+        "Weapon": weapon,
+        "Relationship": relationship,
+        "Circumstance": choice(CIRCUMSTANCES),
+        "Subcircum": np.full(n, "", dtype=object),
+        "VicCount": vic_count,
+        "OffCount": off_count,
+        "FileDate": file_date,
+        "MSA": county_fips,
+    }
+    
+    # Every array above is built from Python strings, so the frame is all-string
+    # by construction and needs no astype(str) pass
+    return pd.DataFrame({col: np.asarray(values, dtype=object) for col, values in columns.items()}, dtype=object)
+
+def _shard_plan(n_records, shard_size, seed):
+    # Fixed (size, child seed) layout shared by the sharded and streaming writers,
+    # so both produce the same records for the same seed and shard/batch size
+    n_shards = max(1, -(-n_records // shard_size))
+    seeds = np.random.SeedSequence(seed).spawn(n_shards)
+    return [(min(shard_size, n_records - i * shard_size), seeds[i]) for i in range(n_shards)]
+
+
+def _write_shard(task):
+    # Worker for generate_sharded_homicide_records: one shard -> one headerless part file
+    n_records, seed_seq, part_path = task
+    shard = generate_noisy_homicide_records_vectorized(n_records, seed_seq)
+    shard.to_csv(part_path, index=False, header=False)
+    return part_path
+
+
+@instrumented("noise_adder.write_sharded")
+def generate_sharded_homicide_records(n_records, output_file, seed, n_workers=None,
+                                      shard_size=250000, keep_parts=False):
+    """
+    Generate a large synthetic dataset across a process pool.
+    
+    The records are split into fixed-size shards and every shard gets its own
+    child seed from np.random.SeedSequence(seed).spawn(). Because the shard
+    layout and seeds depend only on n_records, shard_size and seed, the output
+    file is byte-identical for a given master seed whatever n_workers is.
+    
+    Parameters:
+    n_records (int): Total number of records to generate
+    output_file (str): Path of the combined CSV file
+    seed (int): Master seed for the run
+    n_workers (int): Number of worker processes (default: os.cpu_count())
+    shard_size (int): Records per shard / part file (default: 250000)
+    keep_parts (bool): Keep the part files next to the output instead of deleting them
+    
+    Returns:
+    List of part file paths (already removed unless keep_parts is True)
+    """
+    plan = _shard_plan(n_records, shard_size, seed)
+    n_shards = len(plan)
+    
+    parts_dir = f"{output_file}.parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    tasks = [(size, seed_seq, os.path.join(parts_dir, f"part-{i:05d}.csv"))
+             for i, (size, seed_seq) in enumerate(plan)]
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        part_paths = list(executor.map(_write_shard, tasks))
+    
+    # Concatenate the parts in shard order behind a single header row
+    header = generate_noisy_homicide_records_vectorized(0).to_csv(index=False)
+    with open(output_file, "w", newline="") as out:
+        out.write(header)
+        for part_path in part_paths:
+            with open(part_path, "r", newline="") as part:
+                shutil.copyfileobj(part, out, 1024 * 1024)
+    
+    if not keep_parts:
+        shutil.rmtree(parts_dir)
+    
+    print(f"Generated {n_records} records in {n_shards} shards to '{output_file}'")
+    return part_paths
+
+def iter_noisy_homicide_batches(n_records, batch_size=100000, seed=None):
+    """
+    Yield the records as a sequence of fixed-size DataFrames.
+    
+    Only one batch is alive at a time, so memory stays bounded by batch_size
+    whatever n_records is. Batches come from the vectorized generator and are
+    all-string by construction, so they need no per-value type checks.
+    
+    Parameters:
+    n_records (int): Total number of records to generate
+    batch_size (int): Records per batch (default: 100000)
+    seed (int): Master seed; each batch gets its own child seed (default: fresh entropy)
+    
+    Yields:
+    DataFrame batches of at most batch_size rows
+    """
+    for size, seed_seq in _shard_plan(n_records, batch_size, seed):
+        yield generate_noisy_homicide_records_vectorized(size, seed_seq)
+
+
+@instrumented("noise_adder.write", rows=lambda rows_written: rows_written)
+def write_noisy_homicide_records_streaming(n_records, output_file, batch_size=100000, seed=None):
+    """
+    Stream generated records to a CSV file one batch at a time.
+    
+    For a given seed the file is identical to generate_sharded_homicide_records
+    with shard_size=batch_size.
+    
+    Parameters:
+    n_records (int): Total number of records to generate
+    output_file (str): Path of the CSV file to write
+    batch_size (int): Records generated and appended per batch (default: 100000)
+    seed (int): Master seed for the run (default: fresh entropy)
+    
+    Returns:
+    Number of records written
+    """
+    rows_written = 0
+    with open(output_file, "w", newline="") as out:
+        for batch in iter_noisy_homicide_batches(n_records, batch_size, seed):
+            batch.to_csv(out, index=False, header=(rows_written == 0))
+            rows_written += len(batch)
+    return rows_written
 
 # Double check for mixed types in each column - more robust checking
 def check_column_types(df):
@@ -232,31 +497,47 @@ def check_column_types(df):
             issues.append(f"Column '{col}' has mixed types: {types}")
     return issues
 
-# Verify no mixed types
-type_issues = check_column_types(noisy_records)
-if type_issues:
-    print("WARNING: Mixed types detected:")
-    for issue in type_issues:
-        print(f"  - {issue}")
-    
-    # Fix more aggressively by forcing string conversion
-    for col in noisy_records.columns:
-        noisy_records[col] = noisy_records[col].apply(lambda x: str(x))
-    
-    print("\nFixed all columns by explicitly converting each value to string.")
-else:
-    print("All columns have consistent string types.")
-
-# Final verification - check for any non-string values that might have slipped through
-for col in noisy_records.columns:
-    if not all(isinstance(val, str) for val in noisy_records[col].values):
-        print(f"WARNING: Non-string values still present in column '{col}'")
-        # Force conversion once more
-        noisy_records[col] = noisy_records[col].apply(str)
-
-# Save to CSV
-noisy_records.to_csv("noisy_homicide_records.csv", index=False)
-
-# Display the first few rows
-print("\nSample of generated data:")
-print(noisy_records.head())
\ No newline at end of file
+# Generation mode: "vectorized" (NumPy columnar engine), "streaming" (vectorized
+# batches appended straight to the CSV) or "python" (original per-row loop)
+GENERATION_MODE = "vectorized"
+
+if __name__ == "__main__":
+    if GENERATION_MODE == "streaming":
+        # Batches are all-string by construction, so the type checks below are not needed
+        rows_written = write_noisy_homicide_records_streaming(10000, "noisy_homicide_records.csv", seed=42)
+        print(f"Streamed {rows_written} records to noisy_homicide_records.csv")
+    else:
+        # Generate the noisy records
+        if GENERATION_MODE == "vectorized":
+            noisy_records = generate_noisy_homicide_records_vectorized(10000)
+        else:
+            noisy_records = generate_noisy_homicide_records(10000)
+    
+        # Verify no mixed types
+        type_issues = check_column_types(noisy_records)
+        if type_issues:
+            print("WARNING: Mixed types detected:")
+            for issue in type_issues:
+                print(f"  - {issue}")
+    
+            # Fix more aggressively by forcing string conversion
+            for col in noisy_records.columns:
+                noisy_records[col] = noisy_records[col].apply(lambda x: str(x))
+    
+            print("\nFixed all columns by explicitly converting each value to string.")
+        else:
+            print("All columns have consistent string types.")
+
+        # Final verification - check for any non-string values that might have slipped through
+        for col in noisy_records.columns:
+            if not all(isinstance(val, str) for val in noisy_records[col].values):
+                print(f"WARNING: Non-string values still present in column '{col}'")
+                # Force conversion once more
+                noisy_records[col] = noisy_records[col].apply(str)
+
+        # Save to CSV
+        noisy_records.to_csv("noisy_homicide_records.csv", index=False)
+
+        # Display the first few rows
+        print("\nSample of generated data:")
+        print(noisy_records.head())
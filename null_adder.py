@@ -1,8 +1,30 @@
-import pandas as pd
 import numpy as np
-import random
+
+from data_cache import load_csv
+from instrumentation import stage
 #null adder code
-def add_random_nulls(input_csv_path, output_csv_path, num_rows, protected_columns, null_percentage):
+def _sample_null_mask(isna_block, num_nulls, rng):
+    """
+    Choose num_nulls distinct cells of a block to null out, skipping cells that are already null.
+    
+    Parameters:
+    isna_block (ndarray): Boolean (rows x columns) array, True where the cell is already null
+    num_nulls (int): Number of new null cells wanted
+    rng (np.random.Generator): Source of randomness
+    
+    Returns:
+    Boolean array shaped like isna_block, True for the cells to null out
+    """
+    candidates = np.flatnonzero(~isna_block.ravel())
+    if num_nulls > len(candidates):
+        print(f"Warning: Only {len(candidates)} non-null eligible cells available, requested {num_nulls} nulls.")
+        num_nulls = len(candidates)
+    
+    block_mask = np.zeros(isna_block.size, dtype=bool)
+    block_mask[rng.choice(candidates, size=num_nulls, replace=False)] = True
+    return block_mask.reshape(isna_block.shape)
+
+def add_random_nulls(input_csv_path, output_csv_path, num_rows, protected_columns, null_percentage, seed=None):
     """
     Add random null values to a CSV dataset while protecting specified columns.
     
@@ -12,12 +34,15 @@ def add_random_nulls(input_csv_path, output_csv_path, num_rows, protected_column
     num_rows (int): Number of rows to include from the dataset
     protected_columns (list): List of column names that should not contain null values
     null_percentage (float): Percentage of cells to replace with null values (default: 5%)
+    seed (int): Seed for choosing the null cells, for reproducible runs (default: None)
     
     Returns:
     None
     """
-    # Read the CSV file
-    df = pd.read_csv(input_csv_path)
+    # Read the CSV file (via the columnar cache)
+    with stage("null_adder.load") as s:
+        df = load_csv(input_csv_path)
+        s.rows = len(df)
     
     # Select only the first num_rows rows
     if num_rows < len(df):
@@ -44,22 +69,19 @@ def add_random_nulls(input_csv_path, output_csv_path, num_rows, protected_column
     # Calculate how many cells to convert to null
     num_nulls = int(total_eligible_cells * null_percentage)
     
-    # Generate random indices for null values
-    nulls_added = 0
-    while nulls_added < num_nulls:
-        row_idx = random.randint(0, num_rows - 1)
-        col_name = random.choice(eligible_columns)
-        
-        # Skip if already null
-        if pd.isna(df.loc[row_idx, col_name]):
-            continue
-            
-        # Add null value
-        df.loc[row_idx, col_name] = np.nan
-        nulls_added += 1
+    # Pick exactly num_nulls distinct cells among the eligible cells that are not
+    # already null, and null them all with a single mask pass
+    with stage("null_adder.transform", rows=num_rows):
+        eligible_positions = np.flatnonzero(~df.columns.isin(protected_columns))
+        block_mask = _sample_null_mask(df.iloc[:, eligible_positions].isna().to_numpy(), num_nulls, np.random.default_rng(seed))
+        null_mask = np.zeros(df.shape, dtype=bool)
+        null_mask[:, eligible_positions] = block_mask
+        df = df.mask(null_mask)
+        nulls_added = int(block_mask.sum())
     
     # Save the modified dataset
-    df.to_csv(output_csv_path, index=False)
+    with stage("null_adder.write", rows=num_rows):
+        df.to_csv(output_csv_path, index=False)
     
     # Print summary
     print(f"Created new CSV file with {num_rows} rows and {nulls_added} null values.")
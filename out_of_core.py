@@ -0,0 +1,491 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.naive_bayes import MultinomialNB
+from threadpoolctl import threadpool_limits
+
+from instrumentation import peak_rss_mb, stage
+from outlier_detector import KLLSketch
+
+# Columns the notebooks leave out of the features
+DROP_COLUMNS = ['ID', 'CNTYFIPS', 'Ori']
+
+# Rows read from the CSV at a time
+CHUNK_SIZE = 100000
+
+# Rows per partial_fit / booster batch
+BATCH_SIZE = 50000
+
+# Folder for the encoded matrices, the fitted encoder and the booster caches
+WORK_DIR = "out_of_core_data"
+
+# Models trained by train_out_of_core
+OUT_OF_CORE_MODELS = ("SGD", "MultinomialNB", "LightGBM", "XGBoost")
+
+
+class StreamingEncoder:
+    """
+    The notebooks' preprocessing (median impute + scale numbers, most-frequent
+    impute + one-hot encode categories), fitted in one streaming pass.
+
+    Rows are split into train and test by a hash of their ID, so the split
+    does not depend on the chunking and any prefix of the file gets the same
+    split. Statistics come from the training rows only: medians from a KLL
+    sketch, category counts exactly. A column counts as numeric when every
+    non-empty value parses as a number, like pd.read_csv's inference.
+
+    Parameters:
+    target_col (str): Target column (default: 'Solved')
+    id_col (str): Column hashed for the train/test split (default: 'ID')
+    drop_cols (list): Columns left out of the features (default: DROP_COLUMNS)
+    test_size (float): Fraction of rows held out for testing (default: 0.25)
+    k (int): Accuracy parameter of the median sketches (default: 1000)
+    """
+
+    def __init__(self, target_col='Solved', id_col='ID', drop_cols=DROP_COLUMNS, test_size=0.25, k=1000):
+        self.target_col = target_col
+        self.id_col = id_col
+        self.drop_cols = list(drop_cols)
+        self.test_size = test_size
+        self.k = k
+
+    def test_mask(self, chunk):
+        """True for the rows of a chunk that belong to the test split."""
+        hashes = pd.util.hash_pandas_object(chunk[self.id_col], index=False).to_numpy()
+        return hashes % 10000 < self.test_size * 10000
+
+    def fit(self, csv_path, chunksize=CHUNK_SIZE):
+        """Pass over the CSV once and learn the columns, categories, statistics and classes."""
+        numeric, counts, sketches, sums = None, {}, {}, {}
+        target_counts = pd.Series(dtype='int64')
+        self.n_train = self.n_test = 0
+
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            chunk = chunk[chunk[self.target_col].notna()]
+            test = self.test_mask(chunk)
+            self.n_test += int(test.sum())
+            train = chunk[~test]
+            self.n_train += len(train)
+            if numeric is None:
+                self.feature_cols = [col for col in chunk.columns if col not in self.drop_cols + [self.target_col]]
+                numeric = dict.fromkeys(self.feature_cols, True)
+                sketches = {col: KLLSketch(k=self.k, seed=0) for col in self.feature_cols}
+                sums = {col: np.zeros(3) for col in self.feature_cols}
+
+            target_counts = target_counts.add(train[self.target_col].value_counts(), fill_value=0)
+            for col in self.feature_cols:
+                values = train[col]
+                counts[col] = values.value_counts().add(counts.get(col, pd.Series(dtype='int64')), fill_value=0)
+                if numeric[col]:
+                    numbers = pd.to_numeric(chunk[col], errors='coerce')
+                    if (numbers.isna() & chunk[col].notna()).any():
+                        numeric[col] = False
+                        continue
+                    numbers = numbers[~test].dropna().to_numpy(dtype=np.float64)
+                    sketches[col].update(numbers)
+                    sums[col] += [len(numbers), numbers.sum(), (numbers ** 2).sum()]
+
+        self.classes = np.array(sorted(target_counts.index), dtype=object)
+        # Columns without a single training value are dropped, as SimpleImputer does
+        self.feature_cols = [col for col in self.feature_cols if counts[col].sum() > 0]
+        self.numerical_cols = [col for col in self.feature_cols if numeric[col]]
+        self.categorical_cols = [col for col in self.feature_cols if not numeric[col]]
+
+        # Median imputation first, then scaling, as in the notebooks' pipeline
+        self.medians, self.means, self.scales, self.mins, self.maxs = {}, {}, {}, {}, {}
+        for col in self.numerical_cols:
+            n, total, total_sq = sums[col]
+            median = sketches[col].quantile(0.5)
+            n_missing = self.n_train - n
+            mean = (total + n_missing * median) / self.n_train
+            variance = (total_sq + n_missing * median ** 2) / self.n_train - mean ** 2
+            self.medians[col], self.means[col] = median, mean
+            self.scales[col] = np.sqrt(variance) if variance > 0 else 1.0
+            numbers = counts[col].index.astype(float)
+            self.mins[col], self.maxs[col] = numbers.min(), numbers.max()
+
+        # Categories are sorted like OneHotEncoder's; missing values get the most frequent one
+        self.categories = {col: pd.Index(sorted(counts[col].index)) for col in self.categorical_cols}
+        self.most_frequent = {col: self.categories[col].get_loc(counts[col].sort_index().idxmax())
+                              for col in self.categorical_cols}
+        offsets = np.cumsum([0] + [len(self.categories[col]) for col in self.categorical_cols])
+        self.onehot_offsets, self.n_categorical_features = offsets[:-1], offsets[-1]
+        self.n_onehot_features = len(self.numerical_cols) + self.n_categorical_features
+        print(f"Encoder fitted on {self.n_train} training rows ({self.n_test} held out): "
+              f"{len(self.numerical_cols)} numeric, {len(self.categorical_cols)} categorical columns, "
+              f"{self.n_onehot_features} one-hot features")
+        return self
+
+    def ordinal(self, chunk):
+        """
+        Compact float32 matrix of a chunk: numeric columns as read (NaN when
+        missing), then category codes (missing -> most frequent, unseen -> NaN).
+        """
+        block = np.empty((len(chunk), len(self.feature_cols)), dtype=np.float32)
+        for i, col in enumerate(self.numerical_cols):
+            block[:, i] = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+        for i, col in enumerate(self.categorical_cols, start=len(self.numerical_cols)):
+            codes = self.categories[col].get_indexer(chunk[col]).astype(np.float32)
+            codes[chunk[col].isna().to_numpy()] = self.most_frequent[col]
+            codes[codes == -1] = np.nan
+            block[:, i] = codes
+        return block
+
+    def target(self, chunk):
+        """Class codes of a chunk's target (-1 for classes not seen in training)."""
+        return pd.Index(self.classes).get_indexer(chunk[self.target_col])
+
+    def onehot(self, block, scale="standard"):
+        """
+        One-hot CSR matrix of an ordinal block, in the column order of
+        preprocessing_cache.build_preprocessor.
+
+        scale="standard" standardizes the numeric columns like StandardScaler;
+        "minmax" maps them to [0, 1] for models that need non-negative input
+        (MultinomialNB).
+        """
+        n_rows, n_numeric = len(block), len(self.numerical_cols)
+        numeric = block[:, :n_numeric].astype(np.float64)
+        for i, col in enumerate(self.numerical_cols):
+            column = numeric[:, i]
+            column[np.isnan(column)] = self.medians[col]
+            if scale == "minmax":
+                span = self.maxs[col] - self.mins[col]
+                numeric[:, i] = (column - self.mins[col]) / (span if span > 0 else 1.0)
+            else:
+                numeric[:, i] = (column - self.means[col]) / self.scales[col]
+
+        codes = block[:, n_numeric:]
+        rows, cols = np.nonzero(~np.isnan(codes))
+        onehot_cols = self.onehot_offsets[cols] + codes[rows, cols].astype(np.int64)
+        categorical = sp.csr_matrix((np.ones(len(rows)), (rows, onehot_cols)),
+                                    shape=(n_rows, self.n_categorical_features))
+        return sp.hstack([sp.csr_matrix(numeric), categorical], format='csr')
+
+
+def encode_to_disk(csv_path, encoder, work_dir=WORK_DIR, chunksize=CHUNK_SIZE):
+    """
+    Second pass: write the ordinal train and test matrices and targets to
+    .npy files in work_dir, one chunk at a time.
+
+    The files are memory-mapped, so training later reads them in batches
+    without holding the data; the fitted encoder is saved next to them.
+
+    Returns:
+    Dict with the encoder and memory-mapped X_train, y_train, X_test, y_test
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    n_features = len(encoder.feature_cols)
+    arrays = {
+        'X_train': np.lib.format.open_memmap(os.path.join(work_dir, 'X_train.npy'), mode='w+',
+                                             dtype=np.float32, shape=(encoder.n_train, n_features)),
+        'y_train': np.lib.format.open_memmap(os.path.join(work_dir, 'y_train.npy'), mode='w+',
+                                             dtype=np.int16, shape=(encoder.n_train,)),
+        'X_test': np.lib.format.open_memmap(os.path.join(work_dir, 'X_test.npy'), mode='w+',
+                                            dtype=np.float32, shape=(encoder.n_test, n_features)),
+        'y_test': np.lib.format.open_memmap(os.path.join(work_dir, 'y_test.npy'), mode='w+',
+                                            dtype=np.int16, shape=(encoder.n_test,)),
+    }
+    written = {'train': 0, 'test': 0}
+    for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+        chunk = chunk[chunk[encoder.target_col].notna()]
+        test = encoder.test_mask(chunk)
+        for split, rows in (('train', chunk[~test]), ('test', chunk[test])):
+            start, stop = written[split], written[split] + len(rows)
+            arrays[f'X_{split}'][start:stop] = encoder.ordinal(rows)
+            arrays[f'y_{split}'][start:stop] = encoder.target(rows)
+            written[split] = stop
+    for array in arrays.values():
+        array.flush()
+    joblib.dump(encoder, os.path.join(work_dir, 'encoder.joblib'))
+    return {'encoder': encoder, 'work_dir': work_dir, **arrays}
+
+
+def open_store(work_dir=WORK_DIR):
+    """Reopen the matrices and encoder written by encode_to_disk."""
+    store = {'encoder': joblib.load(os.path.join(work_dir, 'encoder.joblib')), 'work_dir': work_dir}
+    for name in ('X_train', 'y_train', 'X_test', 'y_test'):
+        store[name] = np.load(os.path.join(work_dir, f'{name}.npy'), mmap_mode='r')
+    return store
+
+
+def _batches(n_rows, batch_size, rng=None):
+    starts = np.arange(0, n_rows, batch_size)
+    if rng is not None:
+        rng.shuffle(starts)
+    return [(start, min(start + batch_size, n_rows)) for start in starts]
+
+
+def _fit_partial(model, store, scale, n_epochs, batch_size, random_state):
+    # Incremental fit: one one-hot batch in memory at a time, batches visited in a new order each epoch
+    rng = np.random.default_rng(random_state)
+    encoder, X, y = store['encoder'], store['X_train'], store['y_train']
+    classes = np.arange(len(encoder.classes))
+    for _ in range(n_epochs):
+        for start, stop in _batches(len(y), batch_size, rng):
+            model.partial_fit(encoder.onehot(np.asarray(X[start:stop]), scale), y[start:stop], classes=classes)
+    return model
+
+
+def _fit_lightgbm(store, num_boost_round, batch_size, n_threads):
+    # LightGBM reads the memmap through a Sequence and bins it in memory (one small integer per
+    # cell, much smaller than the float matrix). The binned Dataset is saved next to the store
+    # and loaded instead of binning again while it is newer than the training matrix.
+    import lightgbm as lgb
+
+    class MemmapSequence(lgb.Sequence):
+        # Batch access to the memory-mapped training matrix
+        def __init__(self):
+            self.X = store['X_train']
+            self.batch_size = batch_size
+
+        def __getitem__(self, idx):
+            # LightGBM samples the bin boundaries from float64 rows
+            return np.asarray(self.X[idx], dtype=np.float64)
+
+        def __len__(self):
+            return len(self.X)
+
+    encoder = store['encoder']
+    binary_path = os.path.join(store['work_dir'], 'lightgbm_train.bin')
+    params = {'objective': 'multiclass', 'num_class': len(encoder.classes), 'num_threads': n_threads,
+              'verbose': -1, 'seed': 42}
+    sources = [os.path.join(store['work_dir'], f'{name}.npy') for name in ('X_train', 'y_train')]
+    if os.path.exists(binary_path) and all(os.path.getmtime(binary_path) > os.path.getmtime(path)
+                                           for path in sources):
+        dataset = lgb.Dataset(binary_path, params={'verbose': -1})
+    else:
+        categorical = list(range(len(encoder.numerical_cols), len(encoder.feature_cols)))
+        dataset = lgb.Dataset([MemmapSequence()], label=np.asarray(store['y_train']),
+                              categorical_feature=categorical, params={'verbose': -1})
+        dataset.construct()
+        tmp_path = f"{binary_path}.tmp"
+        dataset.save_binary(tmp_path)
+        os.replace(tmp_path, binary_path)
+    return lgb.train(params, dataset, num_boost_round=num_boost_round)
+
+
+def _fit_xgboost(store, num_boost_round, batch_size, n_threads):
+    # XGBoost reads the memmap through a DataIter and keeps its quantized pages in an external-memory cache
+    import xgboost as xgb
+
+    class ChunkIter(xgb.DataIter):
+        def __init__(self):
+            self._batches = _batches(len(store['y_train']), batch_size)
+            self._position = 0
+            super().__init__(cache_prefix=os.path.join(store['work_dir'], 'xgboost-cache'))
+
+        def next(self, input_data):
+            if self._position == len(self._batches):
+                return False
+            start, stop = self._batches[self._position]
+            input_data(data=np.asarray(store['X_train'][start:stop]), label=store['y_train'][start:stop])
+            self._position += 1
+            return True
+
+        def reset(self):
+            self._position = 0
+
+    if hasattr(xgb, 'ExtMemQuantileDMatrix'):
+        dtrain = xgb.ExtMemQuantileDMatrix(ChunkIter(), missing=np.nan, nthread=n_threads)
+    else:
+        dtrain = xgb.DMatrix(ChunkIter(), missing=np.nan, nthread=n_threads)
+    params = {'objective': 'multi:softprob', 'num_class': len(store['encoder'].classes), 'tree_method': 'hist',
+              'nthread': n_threads, 'seed': 42}
+    return xgb.train(params, dtrain, num_boost_round=num_boost_round)
+
+
+def train_out_of_core(store, models=OUT_OF_CORE_MODELS, n_epochs=3, batch_size=BATCH_SIZE,
+                      num_boost_round=100, n_threads=None, random_state=42):
+    """
+    Train models on the encoded store without loading it into memory.
+
+    SGD (logistic loss) and MultinomialNB learn with partial_fit on one-hot
+    batches (MultinomialNB gets min-max scaled numbers, since it needs
+    non-negative input). LightGBM and XGBoost train on the compact ordinal
+    matrix, read in batches into LightGBM's in-memory binned Dataset (cached
+    on disk for later runs) and XGBoost's external-memory pages.
+
+    Returns:
+    Dict of model name -> (fitted model, fit time in seconds)
+    """
+    n_threads = n_threads or os.cpu_count() or 1
+    fitted = {}
+    for name in models:
+        with stage(f"out_of_core.fit.{name}", rows=len(store['y_train'])), threadpool_limits(limits=n_threads):
+            start = time.perf_counter()
+            if name == "SGD":
+                model = _fit_partial(SGDClassifier(loss='log_loss', random_state=random_state),
+                                     store, "standard", n_epochs, batch_size, random_state)
+            elif name == "MultinomialNB":
+                model = _fit_partial(MultinomialNB(), store, "minmax", 1, batch_size, random_state)
+            elif name == "LightGBM":
+                model = _fit_lightgbm(store, num_boost_round, batch_size, n_threads)
+            elif name == "XGBoost":
+                model = _fit_xgboost(store, num_boost_round, batch_size, n_threads)
+            else:
+                raise ValueError(f"Unknown out-of-core model {name!r}; use one of {OUT_OF_CORE_MODELS}")
+            fitted[name] = (model, time.perf_counter() - start)
+        print(f"{name} trained on {len(store['y_train'])} rows in {fitted[name][1]:.1f}s")
+    return fitted
+
+
+def predict_out_of_core(name, model, store, X, batch_size=BATCH_SIZE):
+    """Class codes predicted for an ordinal matrix, one batch at a time."""
+    encoder = store['encoder']
+    predictions = []
+    for start, stop in _batches(len(X), batch_size):
+        block = np.asarray(X[start:stop])
+        if name in ("SGD", "MultinomialNB"):
+            predictions.append(model.predict(encoder.onehot(block, "minmax" if name == "MultinomialNB" else "standard")))
+        elif name == "XGBoost":
+            predictions.append(model.inplace_predict(block).argmax(axis=1))
+        else:
+            predictions.append(model.predict(block).argmax(axis=1))
+    return np.concatenate(predictions) if predictions else np.empty(0, dtype=int)
+
+
+def _score(y_true, y_pred):
+    return {'Accuracy': accuracy_score(y_true, y_pred),
+            'F1-Score': f1_score(y_true, y_pred, average='weighted', zero_division=0)}
+
+
+def run_out_of_core(csv_path, work_dir=WORK_DIR, models=OUT_OF_CORE_MODELS, chunksize=CHUNK_SIZE,
+                    batch_size=BATCH_SIZE, n_epochs=3, num_boost_round=100, test_size=0.25,
+                    baseline_test_rows=None):
+    """
+    Fit the encoder, encode the CSV to disk, train and evaluate, all with bounded memory.
+
+    Parameters:
+    csv_path (str): Full dataset, e.g. 'SHR65_23.csv'
+    work_dir (str): Folder for the encoded matrices and booster caches
+    models (tuple): Out of OUT_OF_CORE_MODELS
+    chunksize (int): CSV rows read at a time
+    batch_size (int): Rows per training / prediction batch
+    n_epochs (int): Passes of SGD over the training rows
+    num_boost_round (int): Boosting rounds of LightGBM and XGBoost
+    test_size (float): Fraction of rows held out (by ID hash)
+    baseline_test_rows (int): Also score the first this many test rows, which
+        are the in-memory baseline's test rows (see compare_with_in_memory)
+
+    Returns:
+    List of result dicts, one per model
+    """
+    with stage("out_of_core.fit_encoder"):
+        encoder = StreamingEncoder(test_size=test_size).fit(csv_path, chunksize)
+    with stage("out_of_core.encode", rows=encoder.n_train + encoder.n_test):
+        store = encode_to_disk(csv_path, encoder, work_dir, chunksize)
+
+    results = []
+    y_test = np.asarray(store['y_test'])
+    for name, (model, fit_time) in train_out_of_core(store, models, n_epochs, batch_size, num_boost_round).items():
+        y_pred = predict_out_of_core(name, model, store, store['X_test'], batch_size)
+        result = {'Model': name, 'Mode': 'out-of-core', 'Train Rows': encoder.n_train, 'Test Rows': len(y_test),
+                  **_score(y_test, y_pred), 'Fit Time (s)': fit_time}
+        if baseline_test_rows:
+            result['Baseline Test Accuracy'] = accuracy_score(y_test[:baseline_test_rows],
+                                                              y_pred[:baseline_test_rows])
+        results.append(result)
+    peak = peak_rss_mb()
+    for result in results:
+        result['Peak RSS MB'] = peak
+    return results
+
+
+def in_memory_baseline(csv_path, models=OUT_OF_CORE_MODELS, max_rows=100000, n_epochs=3, num_boost_round=100,
+                       test_size=0.25):
+    """
+    The notebooks' in-memory route on the first max_rows rows, for comparison:
+    load, build_preprocessor one-hot matrix, fit each model in one call.
+
+    Uses the same ID-hash split as the out-of-core run, so its test rows are
+    the first test rows of the out-of-core run.
+
+    Returns:
+    List of result dicts, one per model
+    """
+    from lightgbm import LGBMClassifier
+    from xgboost import XGBClassifier
+    from sklearn.preprocessing import MinMaxScaler
+
+    from data_cache import load_csv
+    from preprocessing_cache import build_preprocessor
+
+    encoder = StreamingEncoder(test_size=test_size)
+    data = load_csv(csv_path, compact=False)
+    data = data.head(max_rows) if max_rows else data
+    data = data[data[encoder.target_col].notna()]
+    test = encoder.test_mask(data.astype({encoder.id_col: str}))
+    X = data.drop(columns=DROP_COLUMNS + [encoder.target_col], errors='ignore')
+    classes = np.array(sorted(data.loc[~test, encoder.target_col].astype(str).unique()), dtype=object)
+    y = pd.Index(classes).get_indexer(data[encoder.target_col].astype(str))
+    categorical_cols = X.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
+    numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
+    X = X.astype({col: str for col in categorical_cols})
+    X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+
+    results = []
+    for name in models:
+        start = time.perf_counter()
+        preprocessor = build_preprocessor(numerical_cols, categorical_cols)
+        if name == "MultinomialNB":
+            preprocessor.set_params(num__scaler=MinMaxScaler())
+        X_train_processed = preprocessor.fit_transform(X_train)
+        X_test_processed = preprocessor.transform(X_test)
+        model = {
+            "SGD": lambda: SGDClassifier(loss='log_loss', random_state=42, max_iter=n_epochs, tol=None),
+            "MultinomialNB": lambda: MultinomialNB(),
+            "LightGBM": lambda: LGBMClassifier(n_estimators=num_boost_round, random_state=42, verbose=-1),
+            "XGBoost": lambda: XGBClassifier(n_estimators=num_boost_round, random_state=42, tree_method='hist'),
+        }[name]()
+        model.fit(X_train_processed, y_train)
+        fit_time = time.perf_counter() - start
+        results.append({'Model': name, 'Mode': 'in-memory', 'Train Rows': len(y_train), 'Test Rows': len(y_test),
+                        **_score(y_test, model.predict(X_test_processed)), 'Fit Time (s)': fit_time})
+    peak = peak_rss_mb()
+    for result in results:
+        result['Peak RSS MB'] = peak
+    return results
+
+
+def compare_with_in_memory(csv_path, work_dir=WORK_DIR, baseline_rows=100000, **options):
+    """
+    Train the same models in memory on the first baseline_rows rows (as the
+    notebooks do) and out-of-core on the whole file, and compare accuracy,
+    fit time and peak RSS.
+
+    Each mode runs in its own spawned (not forked) process, so peak RSS is
+    measured per mode and does not include this process's footprint.
+    The out-of-core models are also scored on the baseline's test rows
+    (Baseline Test Accuracy), for a like-for-like comparison.
+
+    Returns:
+    DataFrame with one row per model and mode
+    """
+    spawn = multiprocessing.get_context("spawn")
+    baseline_options = {key: value for key, value in options.items()
+                        if key in ('models', 'n_epochs', 'num_boost_round', 'test_size')}
+    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+        baseline = executor.submit(in_memory_baseline, csv_path, max_rows=baseline_rows, **baseline_options).result()
+    for result in baseline:
+        result['Baseline Test Accuracy'] = result['Accuracy']
+    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+        out_of_core = executor.submit(run_out_of_core, csv_path, work_dir,
+                                      baseline_test_rows=baseline[0]['Test Rows'], **options).result()
+
+    results = pd.DataFrame(baseline + out_of_core)
+    print(results.to_string(index=False))
+    return results
+
+
+if __name__ == "__main__":
+    # Full SHR file out-of-core against the notebooks' 100k-row in-memory training
+    compare_with_in_memory('SHR65_23.csv')
@@ -1,9 +1,91 @@
 import pandas as pd
 import numpy as np
 import os
-import random
 
-def add_outliers_to_crime_data(input_file, output_file, outlier_percentage=0.05):
+from data_cache import load_csv
+from instrumentation import stage
+
+# Fields we can modify to create outliers
+NUMERICAL_FIELDS = ['VicAge', 'OffAge']
+CATEGORICAL_FIELDS = ['VicSex', 'OffSex', 'VicRace', 'OffRace', 'Weapon', 'Relationship']
+
+# Unusual values swapped into the categorical fields
+UNUSUAL_VALUES = {
+    'VicSex': ['Unknown', 'Other'],
+    'OffSex': ['Unknown', 'Other'],
+    'VicRace': ['Multi-racial', 'Pacific Islander', 'Other'],
+    'OffRace': ['Multi-racial', 'Pacific Islander', 'Other'],
+    'Weapon': ['Poison', 'Explosives', 'Narcotics', 'Drowning', 'Advanced technology'],
+    'Relationship': ['Unknown complex relationship', 'Multiple relationships', 'Time-traveler'],
+}
+
+def _plan_outliers(n_rows, n_outliers, rng):
+    """
+    Draw every outlier up front as arrays, grouped by the field they modify.
+    
+    Returns a dict of field -> (row positions, outlier values), with positions
+    sorted so a contiguous slice of rows can find its share with searchsorted.
+    """
+    plan = {}
+    
+    def add(field, positions, values):
+        order = np.argsort(positions, kind='stable')
+        plan[field] = (positions[order], values[order])
+    
+    # 1. Age and categorical outliers: one randomly chosen field per selected row
+    fields = NUMERICAL_FIELDS + CATEGORICAL_FIELDS
+    outlier_rows = rng.choice(n_rows, size=n_outliers, replace=False)
+    field_choice = rng.integers(0, len(fields), size=n_outliers)
+    for i, field in enumerate(fields):
+        rows = outlier_rows[field_choice == i]
+        k = len(rows)
+        if field in NUMERICAL_FIELDS:
+            # Either very old (90-120 years) or inappropriately young for crime data (8-12 years)
+            values = np.where(rng.random(k) < 0.5, rng.integers(90, 121, size=k), rng.integers(8, 13, size=k))
+        else:
+            options = np.array(UNUSUAL_VALUES[field], dtype=object)
+            values = options[rng.integers(0, len(options), size=k)]
+        add(field, rows, values)
+    
+    # 2. Unusually high VicCount or OffCount values
+    high_count_rows = rng.choice(n_rows, size=int(n_outliers/4), replace=False)
+    on_victims = rng.random(len(high_count_rows)) < 0.5
+    high_counts = rng.integers(10, 51, size=len(high_count_rows))
+    for field, rows_mask in (('VicCount', on_victims), ('OffCount', ~on_victims)):
+        if rows_mask.any():
+            add(field, high_count_rows[rows_mask], high_counts[rows_mask])
+    
+    # 3. Anachronistic years, either in the future or far in the past
+    year_rows = rng.choice(n_rows, size=int(n_outliers/4), replace=False)
+    k = len(year_rows)
+    if k:
+        add('Year', year_rows, np.where(rng.random(k) < 0.5, rng.integers(2025, 2051, size=k), rng.integers(1800, 1901, size=k)))
+    
+    return plan
+
+def _apply_outlier_plan(df, plan, start=0):
+    """
+    Write the planned outliers that fall in rows [start, start + len(df)) into df.
+    
+    Each field gets a single positional assignment for all of its rows.
+    """
+    stop = start + len(df)
+    for field, (positions, values) in plan.items():
+        lo, hi = np.searchsorted(positions, [start, stop])
+        if lo == hi or field not in df.columns:
+            continue
+        values = values[lo:hi]
+        column = df[field]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Make room for the new outlier values in the category dictionary
+            new_categories = pd.Index(pd.unique(values)).difference(column.cat.categories)
+            df[field] = column.cat.add_categories(new_categories)
+        elif not pd.api.types.is_numeric_dtype(column.dtype) and values.dtype != object:
+            # Text columns get the same text the number would have been written as
+            values = values.astype(str)
+        df.iloc[positions[lo:hi] - start, df.columns.get_loc(field)] = values
+
+def add_outliers_to_crime_data(input_file, output_file, outlier_percentage=0.05, seed=None):
     """
     Add outliers to the crime dataset to reduce ML model accuracy.
     
@@ -11,13 +93,16 @@ def add_outliers_to_crime_data(input_file, output_file, outlier_percentage=0.05)
     - input_file: Path to the input CSV file
     - output_file: Path to save the output CSV file with outliers
     - outlier_percentage: Percentage of data points to convert to outliers (default: 5%)
+    - seed: Seed for the outlier draws, for reproducible runs (default: None)
     
     Returns:
     - DataFrame with added outliers
     """
     print(f"Loading crime dataset from {input_file}")
-    # Load the dataset with proper quoting to handle complex fields
-    df = pd.read_csv(input_file, quotechar='"', escapechar='\\')
+    # Load the dataset with proper quoting to handle complex fields (via the columnar cache)
+    with stage("outlier_adder.load") as s:
+        df = load_csv(input_file, quotechar='"', escapechar='\\')
+        s.rows = len(df)
     
     # Make a copy to avoid modifying the original DataFrame
     df_outliers = df.copy()
@@ -27,100 +112,74 @@ def add_outliers_to_crime_data(input_file, output_file, outlier_percentage=0.05)
     n_outliers = int(n_rows * outlier_percentage)
     print(f"Planning to add outliers to {n_outliers} rows out of {n_rows}")
     
-    # Fields we can modify to create outliers
-    numerical_fields = ['VicAge', 'OffAge']
-    categorical_fields = ['VicSex', 'OffSex', 'VicRace', 'OffRace', 'Weapon', 'Relationship']
-    
-    # Track modifications for reporting
-    modifications = {field: 0 for field in numerical_fields + categorical_fields}
-    
-    # 1. Add age outliers (extreme ages)
-    outlier_indices = np.random.choice(df.index, size=n_outliers, replace=False)
-    
-    for idx in outlier_indices:
-        # Select which field to modify
-        field_to_modify = random.choice(numerical_fields + categorical_fields)
-        
-        if field_to_modify in numerical_fields:
-            # Handle numerical fields - create extreme ages
-            if field_to_modify == 'VicAge' or field_to_modify == 'OffAge':
-                # Generate an extreme age (either very young or very old)
-                if random.random() < 0.5:
-                    # Very old (90-120 years)
-                    outlier_value = random.randint(90, 120)
-                else:
-                    # Inappropriately young for crime data (8-12 years)
-                    outlier_value = random.randint(8, 12)
-                
-                # Apply the outlier
-                df_outliers.at[idx, field_to_modify] = outlier_value
-                modifications[field_to_modify] += 1
-        
-        else:
-            # Handle categorical fields - swap to unusual combinations
-            if field_to_modify in ['VicSex', 'OffSex']:
-                # Randomly assign unusual gender code
-                unusual_sex = random.choice(['Unknown', 'Other'])
-                df_outliers.at[idx, field_to_modify] = unusual_sex
-                modifications[field_to_modify] += 1
-            
-            elif field_to_modify in ['VicRace', 'OffRace']:
-                # Assign unusual race category
-                unusual_race = random.choice(['Multi-racial', 'Pacific Islander', 'Other'])
-                df_outliers.at[idx, field_to_modify] = unusual_race
-                modifications[field_to_modify] += 1
-            
-            elif field_to_modify == 'Weapon':
-                # Assign unusual weapon
-                unusual_weapons = ['Poison', 'Explosives', 'Narcotics', 'Drowning', 'Advanced technology']
-                df_outliers.at[idx, field_to_modify] = random.choice(unusual_weapons)
-                modifications[field_to_modify] += 1
-            
-            elif field_to_modify == 'Relationship':
-                # Assign unusual relationship
-                unusual_relations = ['Unknown complex relationship', 'Multiple relationships', 'Time-traveler']
-                df_outliers.at[idx, field_to_modify] = random.choice(unusual_relations)
-                modifications[field_to_modify] += 1
-    
-    # 2. Create some unusually high VicCount and OffCount values
-    high_count_indices = np.random.choice(df.index, size=int(n_outliers/4), replace=False)
-    for idx in high_count_indices:
-        # Very high victim or offender counts
-        high_count = random.randint(10, 50)
-        field = random.choice(['VicCount', 'OffCount'])
-        df_outliers.at[idx, field] = high_count
-        
-        # Track this modification
-        if field not in modifications:
-            modifications[field] = 0
-        modifications[field] += 1
-    
-    # 3. Change Years to create anachronistic entries
-    year_outlier_indices = np.random.choice(df.index, size=int(n_outliers/4), replace=False)
-    for idx in year_outlier_indices:
-        # Either future years or very old years
-        if random.random() < 0.5:
-            future_year = random.randint(2025, 2050)
-            df_outliers.at[idx, 'Year'] = future_year
-        else:
-            past_year = random.randint(1800, 1900)
-            df_outliers.at[idx, 'Year'] = past_year
-            
-        # Track this modification
-        if 'Year' not in modifications:
-            modifications['Year'] = 0
-        modifications['Year'] += 1
+    # Draw all outliers as arrays, then apply them with one assignment per field
+    with stage("outlier_adder.transform", rows=n_rows):
+        rng = np.random.default_rng(seed)
+        plan = _plan_outliers(n_rows, n_outliers, rng)
+        _apply_outlier_plan(df_outliers, plan)
     
     # Save the modified DataFrame to new CSV
-    df_outliers.to_csv(output_file, index=False, quoting=1)
+    with stage("outlier_adder.write", rows=n_rows):
+        df_outliers.to_csv(output_file, index=False, quoting=1)
+    print(f"Dataset with outliers saved to {output_file}")
+    
+    _report_modifications(plan)
+    
+    return df_outliers
+
+def add_outliers_to_crime_data_streaming(input_file, output_file, outlier_percentage=0.05,
+                                         chunksize=100000, seed=None):
+    """
+    Chunked version of add_outliers_to_crime_data for files larger than RAM.
+    
+    A first pass counts the rows (reading only the first column), so the
+    outlier plan still hits exactly int(n_rows * outlier_percentage) rows.
+    The second pass reads one chunk at a time, applies that chunk's share of
+    the plan in place and appends it to the output. Values are kept as text
+    so untouched cells are written back exactly as they were read.
+    
+    Parameters:
+    - input_file: Path to the input CSV file
+    - output_file: Path to save the output CSV file with outliers
+    - outlier_percentage: Percentage of data points to convert to outliers (default: 5%)
+    - chunksize: Number of rows held in memory at a time (default: 100000)
+    - seed: Seed for the outlier draws, for reproducible runs (default: None)
+    
+    Returns:
+    - Dict of field -> number of outliers added
+    """
+    read_options = dict(quotechar='"', escapechar='\\', chunksize=chunksize)
+    
+    print(f"Counting rows in {input_file}")
+    with stage("outlier_adder.count") as s:
+        n_rows = s.rows = sum(len(chunk) for chunk in pd.read_csv(input_file, usecols=[0], dtype=str, **read_options))
+    n_outliers = int(n_rows * outlier_percentage)
+    print(f"Planning to add outliers to {n_outliers} rows out of {n_rows}")
+    
+    rng = np.random.default_rng(seed)
+    plan = _plan_outliers(n_rows, n_outliers, rng)
+    
+    start = 0
+    with stage("outlier_adder.stream", rows=n_rows), open(output_file, 'w', newline='') as out:
+        for chunk in pd.read_csv(input_file, dtype=str, keep_default_na=False, **read_options):
+            _apply_outlier_plan(chunk, plan, start)
+            chunk.to_csv(out, index=False, header=(start == 0), quoting=1)
+            start += len(chunk)
     print(f"Dataset with outliers saved to {output_file}")
     
-    # Report modifications
+    return _report_modifications(plan)
+
+def _report_modifications(plan):
+    # Print the per-field outlier counts in the same order as before batching
+    modifications = {field: 0 for field in NUMERICAL_FIELDS + CATEGORICAL_FIELDS}
+    for field, (positions, values) in plan.items():
+        modifications[field] = len(positions)
+    
     print("\nOutlier modifications summary:")
     for field, count in modifications.items():
         print(f"- {field}: {count} outliers added")
     
-    return df_outliers
+    return modifications
 
 # Example usage
 if __name__ == "__main__":
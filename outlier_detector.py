@@ -1,17 +1,14 @@
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
-# Load dataset
-df = pd.read_csv('Crime Data Prototype-1.csv')
+from instrumentation import stage
 
 # Select numeric columns
 numeric_cols = ['VicAge', 'OffAge', 'OffCount', 'VicCount']
 
-# Convert to numeric and handle errors
-for col in numeric_cols:
-    df[col] = pd.to_numeric(df[col], errors='coerce')  # Convert, setting non-numeric as NaN
-
-# Drop NaN values to avoid issues
-df_clean = df.dropna(subset=numeric_cols)
+# Rows read per chunk by the streaming detector
+CHUNK_SIZE = 100000
 
 # Function to detect outliers using IQR
 def detect_outliers_iqr(data, column):
@@ -22,7 +19,176 @@ def detect_outliers_iqr(data, column):
     upper_bound = Q3 + 1.5 * IQR
     return data[(data[column] < lower_bound) | (data[column] > upper_bound)]
 
-# Check outliers for each numeric column
-for col in numeric_cols:
-    outliers = detect_outliers_iqr(df_clean, col)
-    print(f"Outliers in {col}:\n", outliers)
+class KLLSketch:
+    """
+    Mergeable approximate quantile sketch (KLL style).
+
+    Values are kept in levels of sorted buffers where an item on level h
+    stands for 2**h original values. When a level outgrows its capacity it is
+    sorted and every other item (random offset) is promoted to the next
+    level. Memory stays around 3*k items whatever the stream length, and two
+    sketches built on different chunks or files can be merged.
+
+    Parameters:
+    k (int): Accuracy parameter; larger k means smaller rank error (default: 200)
+    seed (int): Seed for the compaction coin flips (default: None)
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller buffers
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                # An odd item out stays behind; the rest are paired and half promoted
+                keep = len(items) % 2
+                promoted = items[keep:][self._rng.integers(2)::2]
+                self.levels[level] = items[:keep]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """Add an array of values; NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1) of everything added so far."""
+        if self.n == 0:
+            return np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_), 2 ** level) for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, q * cumulative[-1])
+        return items[order][min(idx, len(items) - 1)]
+
+def _numeric_chunk(chunk, columns):
+    # Convert to numbers and keep complete rows only, like the original dropna(subset=...)
+    numeric = chunk[columns].apply(pd.to_numeric, errors='coerce')
+    return numeric, numeric.notna().all(axis=1)
+
+def compute_iqr_bounds(input_file, columns=numeric_cols, chunksize=CHUNK_SIZE, k=200, seed=None):
+    """
+    Pass one: stream the file and return IQR outlier bounds per column.
+
+    Parameters:
+    - input_file: Path to the CSV file
+    - columns: Numeric columns to check
+    - chunksize: Rows held in memory at a time
+    - k: Accuracy parameter of the quantile sketches
+    - seed: Seed for the sketches (default: None)
+
+    Returns:
+    - Dict of column -> (lower_bound, upper_bound)
+    """
+    sketches = {col: KLLSketch(k=k, seed=seed) for col in columns}
+    with stage("outlier_detector.bounds") as s:
+        s.rows = 0
+        for chunk in pd.read_csv(input_file, usecols=columns, dtype=str, chunksize=chunksize):
+            numeric, complete = _numeric_chunk(chunk, columns)
+            for col in columns:
+                sketches[col].update(numeric.loc[complete, col].to_numpy())
+            s.rows += len(chunk)
+
+    bounds = {}
+    for col, sketch in sketches.items():
+        Q1 = sketch.quantile(0.25)
+        Q3 = sketch.quantile(0.75)
+        IQR = Q3 - Q1
+        bounds[col] = (Q1 - 1.5 * IQR, Q3 + 1.5 * IQR)
+    return bounds
+
+def detect_outliers_streaming(input_file, output_file, columns=numeric_cols, chunksize=CHUNK_SIZE, k=200, seed=None):
+    """
+    Two-pass, bounded-memory IQR outlier detection over several columns.
+
+    Pass one builds a quantile sketch per column (compute_iqr_bounds). Pass
+    two re-reads the file chunk by chunk and writes every row that is an
+    outlier in at least one column to output_file, unchanged, plus an
+    OutlierMask column where bit i is set when the row is an outlier in
+    columns[i].
+
+    Parameters:
+    - input_file: Path to the CSV file
+    - output_file: Path for the flagged rows
+    - columns: Numeric columns to check (default: numeric_cols)
+    - chunksize: Rows held in memory at a time
+    - k: Accuracy parameter of the quantile sketches
+    - seed: Seed for the sketches (default: None)
+
+    Returns:
+    - Dict of column -> number of outlier rows
+    """
+    bounds = compute_iqr_bounds(input_file, columns, chunksize, k, seed)
+    counts = {col: 0 for col in columns}
+
+    with stage("outlier_detector.flag") as s, open(output_file, 'w', newline='') as out:
+        s.rows = 0
+        first = True
+        for chunk in pd.read_csv(input_file, dtype=str, keep_default_na=False, chunksize=chunksize):
+            numeric, complete = _numeric_chunk(chunk, columns)
+            mask = np.zeros(len(chunk), dtype=np.int64)
+            for bit, col in enumerate(columns):
+                lower_bound, upper_bound = bounds[col]
+                flagged = (complete & ((numeric[col] < lower_bound) | (numeric[col] > upper_bound))).to_numpy()
+                counts[col] += int(flagged.sum())
+                mask |= flagged.astype(np.int64) << bit
+
+            outliers = chunk[mask != 0].assign(OutlierMask=mask[mask != 0])
+            outliers.to_csv(out, index=False, header=first)
+            first = False
+            s.rows += len(chunk)
+
+    print(f"Outliers in {input_file} (saved to {output_file}):")
+    for col in columns:
+        lower_bound, upper_bound = bounds[col]
+        print(f"- {col}: {counts[col]} rows outside [{lower_bound:g}, {upper_bound:g}]")
+    return counts
+
+def detect_outliers_in_files(jobs, max_workers=None, **options):
+    """
+    Run detect_outliers_streaming on several files concurrently.
+
+    Parameters:
+    - jobs: List of (input_file, output_file) pairs
+    - max_workers: Number of worker processes (default: os.cpu_count())
+    - **options: Passed on to detect_outliers_streaming
+
+    Returns:
+    - List of per-column outlier counts, in the order of jobs
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(detect_outliers_streaming, input_file, output_file, **options)
+                   for input_file, output_file in jobs]
+        return [future.result() for future in futures]
+
+if __name__ == "__main__":
+    # Flagged rows with their OutlierMask are saved next to the dataset
+    detect_outliers_streaming('Crime Data Prototype-1.csv', 'Crime Data Prototype-1 (outliers).csv')
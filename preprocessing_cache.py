@@ -0,0 +1,136 @@
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import sklearn
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import check_cv
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from data_cache import CACHE_DIR_ENV
+
+# Folder for fitted preprocessors and transformed matrices. Defaults to
+# ".prep_cache" in the working directory, or a subfolder of CIPHER_CACHE_DIR.
+PREP_CACHE_DIR = os.path.join(os.environ.get(CACHE_DIR_ENV) or ".", ".prep_cache")
+
+
+def build_preprocessor(numerical_cols, categorical_cols):
+    """
+    The notebooks' preprocessing: median impute + scale numbers, most-frequent
+    impute + one-hot encode categories.
+    """
+    numerical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+    categorical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+    ])
+    return ColumnTransformer(
+        transformers=[
+            ('num', numerical_transformer, numerical_cols),
+            ('cat', categorical_transformer, categorical_cols)
+        ])
+
+
+def frame_fingerprint(df):
+    """Hash of a DataFrame's values, index, column names and dtypes."""
+    digest = hashlib.sha1()
+    digest.update(repr([(col, str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cache_key(preprocessor, as_text, *frames):
+    # Data + transformer parameters (columns, encoder options) + sklearn version,
+    # since pickled transformers are only valid for the version that wrote them
+    params = sorted((name, repr(value)) for name, value in preprocessor.get_params(deep=True).items())
+    parts = [frame_fingerprint(df) for df in frames] + [repr(params), str(as_text), sklearn.__version__]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _save_matrix(path, matrix):
+    tmp_path = f"{path}.tmp.npz"
+    sp.save_npz(tmp_path, sp.csr_matrix(matrix))
+    os.replace(tmp_path, path)
+
+
+def fit_transform_cached(preprocessor, X_train, X_test, as_text=False, cache_dir=PREP_CACHE_DIR):
+    """
+    Fit the preprocessor on X_train and transform both splits, or load the
+    result of an earlier identical run.
+
+    The cache key covers the train and test data (values, index, columns and
+    dtypes), the transformer's parameters (column lists, imputer and encoder
+    options) and the sklearn version. A hit loads the fitted transformer
+    (joblib) and the transformed matrices (CSR .npz) without touching the data.
+
+    Parameters:
+    preprocessor: Unfitted transformer, e.g. from build_preprocessor
+    X_train, X_test (DataFrame): Raw train/test features
+    as_text (bool): Convert every column to str before fitting, as the
+        notebooks do (default: False)
+    cache_dir (str): Cache folder (default: PREP_CACHE_DIR)
+
+    Returns:
+    Tuple (fitted preprocessor, X_train_processed, X_test_processed)
+    """
+    key = _cache_key(preprocessor, as_text, X_train, X_test)
+    model_path = os.path.join(cache_dir, f"{key}.joblib")
+    train_path = os.path.join(cache_dir, f"{key}-train.npz")
+    test_path = os.path.join(cache_dir, f"{key}-test.npz")
+
+    if all(os.path.exists(path) for path in (model_path, train_path, test_path)):
+        fitted = joblib.load(model_path)
+        X_train_processed = sp.load_npz(train_path)
+        X_test_processed = sp.load_npz(test_path)
+        if not getattr(fitted, "sparse_output_", True):
+            X_train_processed, X_test_processed = X_train_processed.toarray(), X_test_processed.toarray()
+        return fitted, X_train_processed, X_test_processed
+
+    if as_text:
+        X_train, X_test = X_train.astype(str), X_test.astype(str)
+    X_train_processed = preprocessor.fit_transform(X_train)
+    X_test_processed = preprocessor.transform(X_test)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _save_matrix(train_path, X_train_processed)
+    _save_matrix(test_path, X_test_processed)
+    tmp_path = f"{model_path}.tmp"
+    joblib.dump(preprocessor, tmp_path)
+    os.replace(tmp_path, model_path)
+    return preprocessor, X_train_processed, X_test_processed
+
+
+def cross_val_score_cached(preprocessor, model, X, y, cv=5, scoring='accuracy', as_text=False,
+                           cache_dir=PREP_CACHE_DIR):
+    """
+    cross_val_score for a preprocessor + model pipeline, reusing fold transforms.
+
+    Each fold's preprocessing goes through fit_transform_cached, so as long
+    as the fold split is unchanged (same data, same cv) only the model is
+    refitted. Folds are built like cross_val_score builds them (stratified
+    K-fold for classifiers).
+
+    Returns:
+    Array of scores, one per fold
+    """
+    splitter = check_cv(cv, y, classifier=True)
+    scorer = get_scorer(scoring)
+    y = np.asarray(y)
+
+    scores = []
+    for train_idx, test_idx in splitter.split(X, y):
+        _, X_train_processed, X_test_processed = fit_transform_cached(
+            clone(preprocessor), X.iloc[train_idx], X.iloc[test_idx], as_text, cache_dir)
+        fold_model = clone(model).fit(X_train_processed, y[train_idx])
+        scores.append(scorer(fold_model, X_test_processed, y[test_idx]))
+    return np.array(scores)
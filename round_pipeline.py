@@ -0,0 +1,316 @@
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from dataset_creator import _format_csv_column, _resolve_team_features, _write_team_header, _write_team_rows
+from instrumentation import stage
+from null_adder import _sample_null_mask
+from outlier_adder import _apply_outlier_plan, _plan_outliers, _report_modifications
+
+# Rows per record batch flowing between stages
+BATCH_SIZE = 100000
+
+# Buckets used by the shuffle stage when it spills to Parquet
+SPILL_BUCKETS = 16
+
+# pd.read_csv options of every pass over the input: text columns, where empty
+# fields become missing as with the standalone scripts
+READ_OPTIONS = {"dtype": str, "quotechar": '"', "escapechar": "\\"}
+
+
+def load_config(config_path):
+    """
+    Read a round build config (JSON).
+
+    Example:
+    {
+      "input": "Normal Datasets/Crime Data Prototype-3 (120k).csv",
+      "output_directory": "Round-2 Datasets",
+      "seed": 2024,
+      "batch_size": 100000,
+      "spill": "memory",
+      "stages": [
+        {"stage": "shuffle"},
+        {"stage": "nulls", "num_rows": 20000, "null_percentage": 0.10,
+         "protected_columns": ["ID", "CNTYFIPS", "Ori", "Solved"]},
+        {"stage": "outliers", "outlier_percentage": 0.05, "seed": 7},
+        {"stage": "teams", "teams": {"Team 1": ["State", "Year"]}}
+      ]
+    }
+
+    Stages run in the listed order. A stage without its own "seed" gets one
+    derived from the top-level seed. "spill" is "memory" or "parquet"
+    (shuffle buckets written to a temporary folder, or to "spill_dir").
+    """
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    if not config.get("stages"):
+        raise ValueError(f"{config_path}: no stages configured")
+    for stage_config in config["stages"]:
+        if stage_config.get("stage") not in STAGES and stage_config.get("stage") not in FINAL_STAGES:
+            raise ValueError(f"{config_path}: unknown stage {stage_config.get('stage')!r}; "
+                             f"use one of {list(STAGES) + list(FINAL_STAGES)}")
+    return config
+
+
+def _read_batches(input_file, batch_size):
+    return pd.read_csv(input_file, chunksize=batch_size, **READ_OPTIONS)
+
+
+def _count_rows(input_file, batch_size):
+    # Same parse options as _read_batches, so the count matches the rows streamed
+    return sum(len(batch) for batch in pd.read_csv(input_file, usecols=[0], chunksize=batch_size, **READ_OPTIONS))
+
+
+def _rebatch(frames, batch_size):
+    # Re-slice a stream of frames into batches of batch_size rows
+    pending, pending_rows = [], 0
+    for frame in frames:
+        pending.append(frame)
+        pending_rows += len(frame)
+        if pending_rows >= batch_size:
+            merged = pd.concat(pending, ignore_index=True)
+            for start in range(0, len(merged) - batch_size + 1, batch_size):
+                yield merged.iloc[start:start + batch_size]
+            rest = merged.iloc[len(merged) - len(merged) % batch_size:]
+            pending, pending_rows = ([rest], len(rest)) if len(rest) else ([], 0)
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def shuffle_stage(batches, n_rows, params, context):
+    """
+    Uniform shuffle of the whole stream (a barrier: all rows are collected first).
+
+    With spill="memory" the rows are concatenated and permuted in memory.
+    With spill="parquet" every row goes to one of SPILL_BUCKETS random
+    buckets on disk, and each bucket is then read back, shuffled and
+    emitted, as in dada_shuffler.shuffle_csv_external.
+    """
+    rng = np.random.default_rng(params["seed"])
+    batch_size = context["batch_size"]
+
+    if context["spill"] != "parquet":
+        data = pd.concat(list(batches), ignore_index=True)
+        order = rng.permutation(len(data))
+        for start in range(0, len(data), batch_size):
+            yield data.iloc[order[start:start + batch_size]].reset_index(drop=True)
+        return
+
+    n_buckets = params.get("buckets", SPILL_BUCKETS)
+    spill_dir = tempfile.mkdtemp(prefix="shuffle-", dir=context["spill_dir"])
+    try:
+        for batch_number, batch in enumerate(batches):
+            buckets = rng.integers(0, n_buckets, size=len(batch))
+            for bucket in np.unique(buckets):
+                piece = batch[buckets == bucket]
+                piece.to_parquet(os.path.join(spill_dir, f"{bucket}-{batch_number}.parquet"), index=False)
+
+        def bucket_frames():
+            for bucket in range(n_buckets):
+                pieces = sorted(glob.glob(os.path.join(spill_dir, f"{bucket}-*.parquet")))
+                if pieces:
+                    data = pd.concat([pd.read_parquet(path) for path in pieces], ignore_index=True)
+                    yield data.iloc[rng.permutation(len(data))].reset_index(drop=True)
+
+        yield from _rebatch(bucket_frames(), batch_size)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def nulls_stage(batches, n_rows, params, context):
+    """
+    Null injection as in null_adder.add_random_nulls, one batch at a time.
+
+    Keeps the first num_rows rows (default: all) and nulls exactly
+    int(num_rows * eligible columns * null_percentage) cells outside the
+    protected columns, chosen uniformly among the cells that are not null
+    yet. That needs the number of non-null cells of all kept rows first, so
+    the kept rows are collected (a barrier, like shuffle: in memory, or in
+    a Parquet spill with spill="parquet"). Each batch's share is then drawn
+    from a hypergeometric distribution over the remaining non-null cells.
+    """
+    rng = np.random.default_rng(params["seed"])
+    protected_columns = params.get("protected_columns", [])
+    num_rows = _nulls_rows(n_rows, params)
+
+    spill_dir = (tempfile.mkdtemp(prefix="nulls-", dir=context["spill_dir"])
+                 if context["spill"] == "parquet" else None)
+    try:
+        # First pass: keep num_rows rows and count their non-null eligible cells per batch
+        kept, nonnull_counts, eligible_positions = [], [], None
+        remaining_rows = num_rows
+        for batch_number, batch in enumerate(batches):
+            if remaining_rows <= 0:
+                break
+            batch = batch.iloc[:remaining_rows]
+            remaining_rows -= len(batch)
+            if eligible_positions is None:
+                eligible_positions = np.flatnonzero(~batch.columns.isin(protected_columns))
+            nonnull_counts.append(int(batch.iloc[:, eligible_positions].notna().to_numpy().sum()))
+            if spill_dir is None:
+                kept.append(batch)
+            else:
+                path = os.path.join(spill_dir, f"{batch_number}.parquet")
+                batch.to_parquet(path, index=False)
+                kept.append(path)
+
+        n_eligible = 0 if eligible_positions is None else len(eligible_positions)
+        remaining_nulls = int(num_rows * n_eligible * params["null_percentage"])
+        remaining_nonnull = sum(nonnull_counts)
+        if remaining_nulls > remaining_nonnull:
+            print(f"Warning: Only {remaining_nonnull} non-null eligible cells available, "
+                  f"requested {remaining_nulls} nulls.")
+            remaining_nulls = remaining_nonnull
+
+        # Second pass: null each batch's share of the cells
+        nulls_added = 0
+        for item, batch_nonnull in zip(kept, nonnull_counts):
+            batch = item if spill_dir is None else pd.read_parquet(item)
+            if batch_nonnull and remaining_nulls:
+                batch_nulls = int(rng.hypergeometric(batch_nonnull, remaining_nonnull - batch_nonnull,
+                                                     remaining_nulls))
+                block_mask = _sample_null_mask(batch.iloc[:, eligible_positions].isna().to_numpy(),
+                                               batch_nulls, rng)
+                null_mask = np.zeros(batch.shape, dtype=bool)
+                null_mask[:, eligible_positions] = block_mask
+                batch = batch.mask(null_mask)
+                remaining_nulls -= batch_nulls
+                nulls_added += batch_nulls
+            remaining_nonnull -= batch_nonnull
+            yield batch
+    finally:
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    print(f"Nulls: {nulls_added} null values added to {num_rows} rows")
+
+
+def _nulls_rows(n_rows, params):
+    return min(params.get("num_rows") or n_rows, n_rows)
+
+
+def outliers_stage(batches, n_rows, params, context):
+    """Outlier injection as in outlier_adder, applying each batch's share of one plan."""
+    rng = np.random.default_rng(params["seed"])
+    n_outliers = int(n_rows * params.get("outlier_percentage", 0.05))
+    plan = _plan_outliers(n_rows, n_outliers, rng)
+
+    start = 0
+    for batch in batches:
+        _apply_outlier_plan(batch, plan, start)
+        start += len(batch)
+        yield batch
+
+    print(f"Outliers: added to {n_outliers} rows out of {n_rows}")
+    _report_modifications(plan)
+
+
+def teams_stage(batches, params, context):
+    """
+    Final stage: write one CSV per team, formatting each needed column once per batch.
+
+    Team feature lists are resolved like dataset_creator.generate_team_datasets
+    (required features added, unknown features dropped).
+    """
+    output_directory = context["output_directory"]
+    os.makedirs(output_directory, exist_ok=True)
+
+    files, team_features = {}, None
+    try:
+        for batch in batches:
+            if team_features is None:
+                team_features, results = _resolve_team_features(params["teams"], batch.columns)
+                for messages in results.values():
+                    for message in messages:
+                        print(message)
+                for team_name, features in team_features.items():
+                    files[team_name] = open(os.path.join(output_directory, f"{team_name}.csv"), 'w', newline='')
+                    _write_team_header(files[team_name], features)
+                needed_columns = {f for features in team_features.values() for f in features}
+
+            formatted_columns = {col: _format_csv_column(batch[col]) for col in batch.columns if col in needed_columns}
+            for team_name, features in team_features.items():
+                _write_team_rows(files[team_name], features, formatted_columns)
+    finally:
+        for f in files.values():
+            f.close()
+
+    for team_name, features in (team_features or {}).items():
+        print(f"Success: Dataset for {team_name} created with {len(features)} features")
+    print(f"\nAll datasets saved to: {os.path.abspath(output_directory)}")
+
+
+# Stage name -> (stage function, rows coming out given the rows going in)
+STAGES = {
+    "shuffle": (shuffle_stage, lambda n_rows, params: n_rows),
+    "nulls": (nulls_stage, _nulls_rows),
+    "outliers": (outliers_stage, lambda n_rows, params: n_rows),
+}
+
+# Final stages that consume the batches and write the round's files
+FINAL_STAGES = {
+    "teams": teams_stage,
+}
+
+
+def run_pipeline(config):
+    """
+    Build a round's datasets in one streaming pass over the input.
+
+    Record batches flow from the input CSV through the configured stages.
+    Nothing is written between stages; the shuffle and nulls stages keep
+    their rows in memory or in a Parquet spill. The last stage is "teams"
+    (one CSV per team); without it the batches go to config["output"] as a
+    single CSV.
+
+    Parameters:
+    config (dict): Parsed config, see load_config
+    """
+    batch_size = config.get("batch_size", BATCH_SIZE)
+    context = {
+        "batch_size": batch_size,
+        "spill": config.get("spill", "memory"),
+        "spill_dir": config.get("spill_dir"),
+        "output_directory": config.get("output_directory", "."),
+    }
+    stages = config["stages"]
+    misplaced = [stage_config["stage"] for stage_config in stages[:-1] if stage_config["stage"] in FINAL_STAGES]
+    if misplaced:
+        raise ValueError(f"{misplaced[0]} has to be the last stage")
+
+    # Per-stage seeds: explicit ones win, the rest are derived from the top-level seed
+    derived_seeds = np.random.SeedSequence(config.get("seed")).spawn(len(stages))
+
+    with stage("round_pipeline.count") as s:
+        n_rows = s.rows = _count_rows(config["input"], batch_size)
+    print(f"Building round from {config['input']} ({n_rows} rows)")
+
+    # Stages are lazy generators, so the whole stream is timed as one stage
+    with stage("round_pipeline.run", rows=n_rows):
+        batches = _read_batches(config["input"], batch_size)
+        for stage_config, derived_seed in zip(stages, derived_seeds):
+            params = dict(stage_config)
+            if params.get("seed") is None:
+                params["seed"] = derived_seed
+            if params["stage"] in FINAL_STAGES:
+                FINAL_STAGES[params["stage"]](batches, params, context)
+                return
+            stage_function, rows_out = STAGES[params["stage"]]
+            batches = stage_function(batches, n_rows, params, context)
+            n_rows = rows_out(n_rows, params)
+
+        with open(config["output"], 'w', newline='') as out:
+            for batch_number, batch in enumerate(batches):
+                batch.to_csv(out, index=False, header=(batch_number == 0))
+    print(f"Output saved to: {config['output']}")
+
+
+if __name__ == "__main__":
+    run_pipeline(load_config(sys.argv[1] if len(sys.argv) > 1 else "round_config.json"))
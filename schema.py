@@ -0,0 +1,125 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Feature documentation the schema is derived from
+FEATURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "features.txt")
+
+# Documented string columns that are unique per record and gain nothing from
+# a category dictionary; they keep the dtype read_csv gives them
+IDENTIFIER_COLUMNS = ["ID"]
+
+# Compact dtypes for the documented integer columns. Nullable integer types
+# keep missing values (e.g. after null injection) without falling back to float.
+AGE_COLUMNS = ["VicAge", "OffAge"]
+COUNT_COLUMNS = ["VicCount", "OffCount"]
+INTEGER_DTYPES = {
+    "Year": "Int16",
+    "Incident": "Int32",
+    **{col: "Int16" for col in AGE_COLUMNS},
+    **{col: "Int16" for col in COUNT_COLUMNS},
+}
+
+# OffAge uses 999 for an unknown offender age
+UNKNOWN_AGE = 999
+
+
+def read_feature_types(features_file=FEATURES_FILE):
+    """
+    Read the documented column types from features.txt.
+
+    Parameters:
+    features_file (str): Path to the feature documentation
+
+    Returns:
+    Dict of column name -> documented base type ("object", "int64", "float64")
+    """
+    feature_types = {}
+    with open(features_file, encoding="utf-8") as f:
+        for line in f:
+            match = re.match(r"^(\w+) \((\w+)", line.strip())
+            if match:
+                feature_types[match.group(1)] = match.group(2)
+    return feature_types
+
+
+def build_dtype_map(features_file=FEATURES_FILE):
+    """
+    Turn the documented feature types into an explicit dtype map.
+
+    String columns become "category" (identifiers are left out of the map
+    and keep their parsed dtype), the documented integer columns get the
+    small nullable types above, and anything else keeps its documented type.
+
+    Returns:
+    Dict of column name -> pandas dtype name
+    """
+    dtypes = {}
+    for col, kind in read_feature_types(features_file).items():
+        if col in IDENTIFIER_COLUMNS:
+            continue
+        if kind == "object":
+            dtypes[col] = "category"
+        else:
+            dtypes[col] = INTEGER_DTYPES.get(col, kind)
+    return dtypes
+
+
+DTYPES = build_dtype_map()
+
+
+def apply_schema(df, unknown_age_as_na=False):
+    """
+    Convert a freshly parsed crime DataFrame to the compact schema dtypes, in place.
+
+    Conversions are lossless: a documented numeric column is only narrowed
+    when pandas parsed it as numbers and its values fit the target type, so
+    noisy text columns (e.g. an OffAge column containing "Unknown") are left
+    as text.
+
+    Parameters:
+    df (DataFrame): Data to convert
+    unknown_age_as_na (bool): Store the 999 "unknown" OffAge sentinel as a
+        missing value instead of 999 (default: False, keeps the file's values)
+
+    Returns:
+    The same DataFrame, for chaining
+    """
+    for col in df.columns:
+        target = DTYPES.get(col)
+        if target is None:
+            continue
+        column = df[col]
+
+        if target == "category":
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                df[col] = column.astype("category")
+        elif target in INTEGER_DTYPES.values() and pd.api.types.is_numeric_dtype(column.dtype):
+            values = column.dropna()
+            info = np.iinfo(target.lower())
+            if ((values % 1 == 0).all() and (values.empty or (values.min() >= info.min and values.max() <= info.max))):
+                df[col] = column.astype(target)
+                if unknown_age_as_na and col == "OffAge":
+                    df[col] = df[col].mask(df[col] == UNKNOWN_AGE)
+    return df
+
+
+def to_default_dtypes(df):
+    """
+    Undo apply_schema for code that expects read_csv's default dtypes.
+
+    Category columns go back to plain strings, and nullable integers go back
+    to int64, or to float64 when they hold missing values.
+
+    Returns:
+    The same DataFrame, for chaining
+    """
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(dtype.categories.dtype)
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(dtype):
+            df[col] = df[col].astype("float64" if df[col].hasnans else "int64")
+    return df
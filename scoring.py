@@ -0,0 +1,232 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR_ENV, short_hash
+
+# Ground truth the round's submissions are scored against
+GROUND_TRUTH_FILE = "Testing Data 20k.csv"
+
+# Columns of the ground truth and of every submission
+ID_COLUMN = "ID"
+TARGET_COLUMN = "Solved"
+
+# Bump when the cached index layout changes, so old index files are rebuilt
+INDEX_VERSION = 1
+
+# Ground truth of a pool worker, set once by _init_worker
+_worker_truth = None
+
+
+class GroundTruth:
+    """
+    ID-keyed ground truth: ids[i] has label classes[codes[i]].
+
+    The ID lookup table is built once; submissions are joined against it
+    with a single get_indexer call.
+    """
+
+    def __init__(self, ids, codes, classes):
+        self.ids = pd.Index(ids)
+        self.codes = np.asarray(codes)
+        self.classes = list(classes)
+        self.class_index = pd.Index(self.classes)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _index_path(truth_file, id_col, target_col, cache_dir=None):
+    # Same layout as data_cache: <stem>-<source path + columns>-<mtime + size>.truth.npz
+    abs_path = os.path.abspath(truth_file)
+    stat = os.stat(abs_path)
+    source_key = short_hash(f"{abs_path}|{id_col}|{target_col}|{INDEX_VERSION}")
+    version_key = short_hash(f"{stat.st_mtime_ns}|{stat.st_size}")
+
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(abs_path), ".data_cache")
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{source_key}-{version_key}.truth.npz")
+
+
+def _build_index(truth_file, index_path, id_col, target_col):
+    truth = pd.read_csv(truth_file, usecols=[id_col, target_col], dtype=str)
+    duplicated = truth[id_col].duplicated()
+    if duplicated.any():
+        raise ValueError(f"{truth_file}: {int(duplicated.sum())} duplicate {id_col} values in the ground truth")
+    codes, classes = pd.factorize(truth[target_col], sort=True)
+    if (codes == -1).any():
+        raise ValueError(f"{truth_file}: {int((codes == -1).sum())} rows without a {target_col} label")
+
+    ids = truth[id_col].to_numpy(dtype=str)
+    classes = np.asarray(classes.tolist(), dtype=str)
+    codes = codes.astype(np.int8 if len(classes) <= np.iinfo(np.int8).max else np.int32)
+
+    cache_dir = os.path.dirname(index_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Drop stale indexes of the same file before writing the new one
+    prefix = os.path.basename(index_path).rsplit("-", 1)[0]
+    for old_path in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(prefix)}-*.truth.npz")):
+        os.remove(old_path)
+
+    tmp_path = f"{index_path}.tmp.npz"
+    np.savez(tmp_path, ids=ids, codes=codes, classes=classes)
+    os.replace(tmp_path, index_path)
+    return GroundTruth(ids, codes, classes)
+
+
+def load_ground_truth(truth_file=GROUND_TRUTH_FILE, id_col=ID_COLUMN, target_col=TARGET_COLUMN, cache_dir=None):
+    """
+    Load the ground truth as an ID-keyed index, cached across runs.
+
+    The first load reads the CSV and writes the IDs, label codes and class
+    names to a .npz file in the data cache folder; later loads of the
+    unchanged file read that instead. Editing the CSV rebuilds it.
+
+    Parameters:
+    truth_file (str): Ground truth CSV (default: GROUND_TRUTH_FILE)
+    id_col (str): ID column (default: 'ID')
+    target_col (str): Label column (default: 'Solved')
+    cache_dir (str): Folder for the index (default: as data_cache.load_csv)
+
+    Returns:
+    GroundTruth
+    """
+    index_path = _index_path(truth_file, id_col, target_col, cache_dir)
+    if not os.path.exists(index_path):
+        return _build_index(truth_file, index_path, id_col, target_col)
+    with np.load(index_path, allow_pickle=False) as index:
+        return GroundTruth(index["ids"], index["codes"], index["classes"])
+
+
+def score_predictions(truth, ids, labels):
+    """
+    Score one team's predictions against the ground truth.
+
+    Predictions are joined to the ground truth by ID. The first prediction
+    of a duplicated ID counts and the rest are ignored; IDs not in the
+    ground truth are ignored; ground truth rows without a prediction, and
+    predictions that are not a known label, count as wrong. F1-Score is the
+    macro average over the ground truth classes.
+
+    Parameters:
+    truth (GroundTruth): From load_ground_truth
+    ids (array-like): Predicted IDs
+    labels (array-like): Predicted labels, aligned with ids
+
+    Returns:
+    Dict with Accuracy, F1-Score and the join counts
+    """
+    ids = pd.Series(np.asarray(ids, dtype=object))
+    labels = pd.Series(np.asarray(labels, dtype=object), dtype="string")
+    first = ~ids.duplicated().to_numpy()
+    positions = truth.ids.get_indexer(ids[first])
+    known = positions != -1
+    positions = positions[known]
+    predicted_codes = truth.class_index.get_indexer(labels[first].str.strip()[known])
+    valid = predicted_codes != -1
+
+    # Confusion matrix over the ground truth classes; missing or invalid predictions only add false negatives
+    n_classes = len(truth.classes)
+    true_codes = truth.codes[positions[valid]].astype(np.int64)
+    confusion = np.bincount(true_codes * n_classes + predicted_codes[valid], minlength=n_classes * n_classes)
+    confusion = confusion.reshape(n_classes, n_classes)
+    true_positives = np.diag(confusion)
+    predicted_counts = confusion.sum(axis=0)
+    true_counts = np.bincount(truth.codes, minlength=n_classes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted_counts > 0, true_positives / predicted_counts, 0.0)
+        recall = np.where(true_counts > 0, true_positives / true_counts, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    return {
+        "Accuracy": true_positives.sum() / len(truth),
+        "F1-Score": f1.mean(),
+        "Matched IDs": len(positions),
+        "Missing IDs": len(truth) - len(positions),
+        "Duplicate IDs": int((~first).sum()),
+        "Unknown IDs": int((~known).sum()),
+        "Invalid Labels": int((~valid).sum()),
+    }
+
+
+def score_submission(truth, submission_file, id_col=ID_COLUMN, target_col=TARGET_COLUMN):
+    """Score one submission CSV (needs the ID and label columns); see score_predictions."""
+    submission = pd.read_csv(submission_file, usecols=[id_col, target_col], dtype=str)
+    return score_predictions(truth, submission[id_col], submission[target_col])
+
+
+def _init_worker(truth):
+    # Runs once per worker process; later tasks only send file paths
+    global _worker_truth
+    _worker_truth = truth
+
+
+def _score_in_worker(submission_file, id_col, target_col):
+    team = os.path.splitext(os.path.basename(submission_file))[0]
+    try:
+        return {"Team": team, **score_submission(_worker_truth, submission_file, id_col, target_col), "Error": None}
+    except Exception as e:
+        return {"Team": team, "Error": str(e)}
+
+
+def build_leaderboard(submissions_dir, truth=None, pattern="*.csv", max_workers=None,
+                      id_col=ID_COLUMN, target_col=TARGET_COLUMN):
+    """
+    Score every submission in a folder concurrently and rank the teams.
+
+    The team name is the file name without extension. A submission that
+    cannot be read is listed last with its error instead of stopping the run.
+
+    Parameters:
+    submissions_dir (str): Folder of team submission CSVs
+    truth (GroundTruth): Ground truth (default: load_ground_truth())
+    pattern (str): Glob of the submission files (default: '*.csv')
+    max_workers (int): Number of worker processes (default: os.cpu_count())
+
+    Returns:
+    DataFrame sorted by Accuracy then F1-Score, with a Rank column
+    """
+    if truth is None:
+        truth = load_ground_truth(id_col=id_col, target_col=target_col)
+    submission_files = sorted(glob.glob(os.path.join(glob.escape(submissions_dir), pattern)))
+
+    _init_worker(truth)
+    if max_workers == 1 or len(submission_files) <= 1:
+        rows = [_score_in_worker(path, id_col, target_col) for path in submission_files]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(truth,)) as executor:
+            rows = list(executor.map(_score_in_worker, submission_files, [id_col] * len(submission_files),
+                                     [target_col] * len(submission_files), chunksize=8))
+
+    count_columns = ["Matched IDs", "Missing IDs", "Duplicate IDs", "Unknown IDs", "Invalid Labels"]
+    leaderboard = pd.DataFrame(rows, columns=["Team", "Accuracy", "F1-Score", *count_columns, "Error"])
+    leaderboard[count_columns] = leaderboard[count_columns].astype("Int64")
+    leaderboard = leaderboard.sort_values(["Accuracy", "F1-Score", "Team"], ascending=[False, False, True],
+                                          na_position="last").reset_index(drop=True)
+    leaderboard.insert(0, "Rank", leaderboard["Accuracy"].rank(method="min", ascending=False).astype("Int64"))
+    return leaderboard
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a folder of team submissions and print the leaderboard.")
+    parser.add_argument("submissions_dir")
+    parser.add_argument("--truth", default=GROUND_TRUTH_FILE, help="ground truth CSV")
+    parser.add_argument("--output", help="also save the leaderboard to this CSV")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    leaderboard = build_leaderboard(args.submissions_dir, load_ground_truth(args.truth), max_workers=args.workers)
+    print(leaderboard.to_string(index=False))
+    if args.output:
+        leaderboard.to_csv(args.output, index=False)
+        print(f"Leaderboard saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+from sklearn.naive_bayes import GaussianNB
+from threadpoolctl import threadpool_limits
+
+from feature_selection import stratified_sample
+from model_zoo import _fit_gaussian_nb, _predict, _thread_param, plan_thread_budget
+
+# Search spaces for the notebooks' model zoo. Boosters get a generous
+# n_estimators and stop early on the validation split instead.
+PARAM_SPACES = {
+    'Logistic Regression': {'C': [0.01, 0.1, 1, 10, 100], 'class_weight': [None, 'balanced']},
+    'Decision Tree': {'max_depth': [None, 5, 10, 20, 40], 'min_samples_leaf': [1, 2, 5, 10, 20],
+                      'criterion': ['gini', 'entropy']},
+    'Random Forest': {'n_estimators': [50, 100, 200], 'max_depth': [None, 10, 20],
+                      'min_samples_split': [2, 5, 10], 'max_features': ['sqrt', 'log2']},
+    'Extra Trees': {'n_estimators': [50, 100, 200], 'max_depth': [None, 10, 20],
+                    'min_samples_split': [2, 5, 10], 'max_features': ['sqrt', 'log2']},
+    'Gradient Boosting': {'n_estimators': [50, 100, 200], 'learning_rate': [0.01, 0.1, 0.2],
+                          'max_depth': [3, 5, 7], 'subsample': [0.8, 1.0]},
+    'AdaBoost': {'n_estimators': [50, 100, 200], 'learning_rate': [0.1, 0.5, 1.0]},
+    'SVM': {'C': [0.1, 1, 10], 'kernel': ['linear', 'rbf'], 'gamma': ['scale', 'auto']},
+    'K-Nearest Neighbors': {'n_neighbors': [3, 5, 11, 21, 41], 'weights': ['uniform', 'distance']},
+    'Naive Bayes': {'var_smoothing': [1e-9, 1e-8, 1e-7, 1e-6, 1e-5]},
+    'Neural Network': {'hidden_layer_sizes': [(50,), (100,), (100, 50)], 'alpha': [1e-4, 1e-3, 1e-2],
+                       'learning_rate_init': [1e-3, 1e-2]},
+    'XGBoost': {'n_estimators': [1000], 'learning_rate': [0.03, 0.1, 0.3], 'max_depth': [3, 5, 7, 9],
+                'subsample': [0.7, 1.0], 'colsample_bytree': [0.7, 1.0], 'min_child_weight': [1, 5]},
+    'LightGBM': {'n_estimators': [1000], 'learning_rate': [0.03, 0.1, 0.3], 'num_leaves': [15, 31, 63, 127],
+                 'min_child_samples': [10, 20, 50], 'subsample': [0.7, 1.0], 'subsample_freq': [1],
+                 'colsample_bytree': [0.7, 1.0]},
+    'CatBoost': {'n_estimators': [1000], 'learning_rate': [0.03, 0.1, 0.3], 'depth': [4, 6, 8],
+                 'l2_leaf_reg': [1, 3, 10]},
+}
+
+# Rounds without improvement on the validation split before a booster stops
+EARLY_STOPPING_ROUNDS = 20
+
+# Where tune_models keeps the best configuration of every model
+BEST_CONFIGS_FILE = "best_configs.json"
+
+# Inner train/validation split of a pool worker, set once by _init_worker
+_worker_data = None
+
+
+def _library(model):
+    return type(model).__module__.split(".")[0]
+
+
+def _fit_with_early_stopping(model, X, y, X_val, y_val, early_stopping_rounds):
+    # Fit a booster with early stopping on the validation split; returns the number of rounds kept
+    library = _library(model)
+    if library == "xgboost":
+        if model.get_params().get("eval_metric") == "logloss" and len(np.unique(y)) > 2:
+            # The notebooks' binary metric; early stopping needs the multi-class one
+            model.set_params(eval_metric="mlogloss")
+        model.set_params(early_stopping_rounds=early_stopping_rounds)
+        model.fit(X, y, eval_set=[(X_val, y_val)], verbose=False)
+        return model.best_iteration + 1
+    if library == "lightgbm":
+        from lightgbm import early_stopping
+        model.fit(X, y, eval_set=[(X_val, y_val)], callbacks=[early_stopping(early_stopping_rounds, verbose=False)])
+        return model.best_iteration_ or model.n_estimators
+    if library == "catboost":
+        model.fit(X, y, eval_set=(X_val, y_val), early_stopping_rounds=early_stopping_rounds)
+        return model.get_best_iteration() + 1
+    return None
+
+
+def run_trial(model, params, X, y, X_val, y_val, n_threads=1, early_stopping_rounds=EARLY_STOPPING_ROUNDS):
+    """
+    Fit one configuration and score it on the validation split.
+
+    XGBoost, LightGBM and CatBoost stop early on the validation split and
+    report the number of boosting rounds they kept.
+
+    Returns:
+    Dict with Validation Accuracy, Rounds (boosters only) and Fit Time (s)
+    """
+    model = clone(model).set_params(**params)
+    param = _thread_param(model)
+    if param is not None:
+        model.set_params(**{param: n_threads})
+
+    with threadpool_limits(limits=n_threads):
+        start = time.perf_counter()
+        rounds = None
+        if _library(model) in ("xgboost", "lightgbm", "catboost"):
+            rounds = _fit_with_early_stopping(model, X, y, X_val, y_val, early_stopping_rounds)
+        elif isinstance(model, GaussianNB) and sp.issparse(X):
+            _fit_gaussian_nb(model, X, y)
+        else:
+            model.fit(X, y)
+        fit_time = time.perf_counter() - start
+        accuracy = accuracy_score(y_val, _predict(model, X_val))
+
+    return {'Validation Accuracy': accuracy, 'Rounds': rounds, 'Fit Time (s)': fit_time}
+
+
+def _take_rows(X, positions):
+    return X.iloc[positions] if isinstance(X, pd.DataFrame) else X[positions]
+
+
+def _init_worker(X, y, X_val, y_val):
+    # Runs once per worker process; trials only send the model, its parameters and row positions
+    global _worker_data
+    _worker_data = (X, y, X_val, y_val)
+
+
+def _trial_in_worker(name, model, params, positions, n_threads, early_stopping_rounds):
+    X, y, X_val, y_val = _worker_data
+    try:
+        result = run_trial(model, params, _take_rows(X, positions), y[positions], X_val, y_val, n_threads, early_stopping_rounds)
+        return {'Model': name, 'Params': params, **result, 'Error': None}
+    except Exception as e:
+        return {'Model': name, 'Params': params, 'Validation Accuracy': -np.inf, 'Error': str(e).splitlines()[0]}
+
+
+def _candidates(space, n_candidates, random_state):
+    # Random configurations without repeats (the whole grid when it is smaller)
+    n_configs = len(ParameterGrid(space))
+    if n_configs <= n_candidates:
+        return list(ParameterGrid(space))
+    return list(ParameterSampler(space, n_candidates, random_state=random_state))
+
+
+def _jsonable(value):
+    # Parameter values as JSON types (numpy scalars to Python, tuples to lists)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def save_best_configs(configs, path=BEST_CONFIGS_FILE):
+    """Write best configurations to JSON, keeping other models already in the file."""
+    saved = load_best_configs(path) if os.path.exists(path) else {}
+    saved.update(configs)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=1)
+
+
+def load_best_configs(path=BEST_CONFIGS_FILE):
+    """Read configurations written by save_best_configs."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def apply_best_configs(models, configs):
+    """Set each model's tuned parameters in place; models without a config are left as they are."""
+    for name, config in configs.items():
+        if name in models:
+            params = {key: tuple(value) if isinstance(value, list) else value
+                      for key, value in config['params'].items()}
+            models[name].set_params(**params)
+    return models
+
+
+def _n_rungs(n_candidates, eta):
+    # 1 + floor(log_eta(n_candidates)) in integers (math.log(243, 3) is 4.999...)
+    n_rungs = 1
+    while n_candidates >= eta:
+        n_candidates //= eta
+        n_rungs += 1
+    return n_rungs
+
+
+def tune_models(models, X_train, y_train, param_spaces=PARAM_SPACES, n_candidates=27, eta=3, min_rows=1000,
+                validation_size=0.2, early_stopping_rounds=EARLY_STOPPING_ROUNDS, n_cores=None,
+                max_workers=None, random_state=42, output=BEST_CONFIGS_FILE):
+    """
+    Successive-halving search over the models' hyperparameters, with the
+    number of training rows as the resource.
+
+    A validation split is held out of the training data once. Every model
+    starts with n_candidates random configurations trained on a small
+    stratified sample; after each rung only the best 1/eta of them go on,
+    and the sample grows eta-fold, until the survivors train on all
+    remaining rows. XGBoost, LightGBM and CatBoost also stop early on the
+    validation split, and their saved n_estimators is the number of rounds
+    the best trial kept.
+
+    All trials of a rung run in one process pool sized by
+    model_zoo.plan_thread_budget; the (cached, preprocessed) matrices are
+    sent to each worker once.
+
+    Parameters:
+    models (dict): Model name -> estimator, as in the notebooks
+    X_train, y_train: Preprocessed training data (X may be sparse)
+    param_spaces (dict): Model name -> {parameter: list of values}; models
+        without a space are skipped
+    n_candidates (int): Configurations per model in the first rung
+    eta (int): Halving rate
+    min_rows (int): Smallest training sample
+    validation_size (float): Fraction of the training rows held out for scoring
+    early_stopping_rounds (int): Patience of the boosters' early stopping
+    n_cores (int): Cores to use (default: os.cpu_count())
+    max_workers (int): Upper bound on concurrent trials (default: n_cores;
+        1 runs every trial in this process)
+    random_state (int): Seed of the split, samples and configurations
+    output (str): JSON file for the best configurations (None to skip saving)
+
+    Returns:
+    Tuple (dict of model name -> best config, DataFrame of all trials)
+    """
+    if eta < 2:
+        raise ValueError(f"eta has to be at least 2, got {eta}")
+    y_train = np.asarray(y_train)
+    fit_positions, val_positions = train_test_split(np.arange(len(y_train)), test_size=validation_size,
+                                                    stratify=y_train, random_state=random_state)
+    X_fit, y_fit = _take_rows(X_train, fit_positions), y_train[fit_positions]
+    X_val, y_val = _take_rows(X_train, val_positions), y_train[val_positions]
+
+    tuned = {name: model for name, model in models.items() if name in param_spaces}
+    for name in models:
+        if name not in tuned:
+            print(f"No search space for {name}; skipping")
+    survivors = {name: _candidates(param_spaces[name], n_candidates, random_state) for name in tuned}
+
+    n_rungs = _n_rungs(max(len(c) for c in survivors.values()), eta) if survivors else 0
+    n_workers, budget = plan_thread_budget(tuned, n_cores, max_workers)
+    trials = []
+    _init_worker(X_fit, y_fit, X_val, y_val)
+    executor = (ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                    initargs=(X_fit, y_fit, X_val, y_val)) if n_workers > 1 else None)
+    try:
+        for rung in range(n_rungs):
+            n_rows = max(min_rows, int(len(y_fit) / eta ** (n_rungs - 1 - rung)))
+            positions = stratified_sample(y_fit, n_rows, random_state)
+            tasks = [(name, tuned[name], params, positions, budget[name], early_stopping_rounds)
+                     for name, candidates in survivors.items() for params in candidates]
+            print(f"Rung {rung + 1}/{n_rungs}: {len(tasks)} trials on {len(positions)} rows")
+
+            start = time.perf_counter()
+            if executor is None:
+                results = [_trial_in_worker(*task) for task in tasks]
+            else:
+                results = list(executor.map(_trial_in_worker, *zip(*tasks)))
+            print(f"  done in {time.perf_counter() - start:.1f}s")
+
+            for result in results:
+                result.update(Rung=rung + 1, Rows=len(positions))
+                if result['Error']:
+                    print(f"  {result['Model']} {result['Params']} failed: {result['Error']}")
+            trials.extend(results)
+
+            # Keep the best 1/eta of each model's configurations for the next rung
+            for name in survivors:
+                ranked = sorted((r for r in results if r['Model'] == name),
+                                key=lambda r: r['Validation Accuracy'], reverse=True)
+                survivors[name] = [r['Params'] for r in ranked[:max(1, len(ranked) // eta)]]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    trials = pd.DataFrame(trials)
+    best_configs = {}
+    for name in tuned:
+        last = trials[(trials['Model'] == name) & (trials['Rung'] == n_rungs)]
+        best = last.loc[last['Validation Accuracy'].idxmax()]
+        if best['Error']:
+            print(f"{name} - every configuration failed; nothing saved")
+            continue
+        params = {key: _jsonable(value) for key, value in best['Params'].items()}
+        if 'Rounds' in best and pd.notna(best['Rounds']):
+            params['n_estimators'] = int(best['Rounds'])
+        best_configs[name] = {'params': params, 'validation_accuracy': float(best['Validation Accuracy']),
+                              'rows': int(best['Rows']), 'trials': int((trials['Model'] == name).sum())}
+        print(f"{name} - validation accuracy {best['Validation Accuracy']:.4f} with {params}")
+
+    if output:
+        save_best_configs(best_configs, output)
+        print(f"Best configurations saved to {output}")
+    return best_configs, trials